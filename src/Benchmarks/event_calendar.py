@@ -0,0 +1,68 @@
+'''
+    Event calendar benchmark - events/sec as the number of nodes (Nn) grows
+
+    Emulates the event pattern of the simulator: each node holds a few pending events, every step the
+    earliest event in the system is executed and its node schedules a new event a random time later.
+
+    Compares:
+        scan - the per-node minimum scan previously used by Simulation.get_next_event
+               (a time ordered list per node + min over all nodes)
+        heap/calendar - the global EventCalendar backends
+
+    run from src: python -m Benchmarks.event_calendar [num_events]
+'''
+import bisect
+import random
+import sys
+import time
+
+import Chain.EventCalendar as EventCalendar
+
+NODE_COUNTS = [4, 16, 64, 256, 1024]
+EVENTS_PER_NODE = 4
+
+
+def scan(nodes, num_events):
+    queues = [[] for _ in range(nodes)]
+    for q in queues:
+        for _ in range(EVENTS_PER_NODE):
+            bisect.insort(q, random.expovariate(1))
+
+    for _ in range(num_events):
+        node = min((q for q in queues if q), key=lambda q: q[0])
+        t = node.pop(0)
+        bisect.insort(node, t + random.expovariate(1))
+
+
+def calendar(backend, nodes, num_events):
+    cal = EventCalendar.create(backend)
+    for n in range(nodes):
+        for _ in range(EVENTS_PER_NODE):
+            cal.push(random.expovariate(1), n, None)
+
+    for _ in range(num_events):
+        entry = cal.pop()
+        cal.push(entry.time + random.expovariate(1), entry.queue, None)
+
+
+def measure(f, *args):
+    random.seed(0)
+    t = time.perf_counter()
+    f(*args)
+    return time.perf_counter() - t
+
+
+def run(num_events=20_000):
+    print(f"{'Nn':>6} {'scan':>12} {'heap':>12} {'calendar':>12}   (events/sec)")
+
+    for nodes in NODE_COUNTS:
+        results = [
+            measure(scan, nodes, num_events),
+            measure(calendar, "heap", nodes, num_events),
+            measure(calendar, "calendar", nodes, num_events),
+        ]
+        print(f"{nodes:>6}", *[f"{num_events / r:>12,.0f}" for r in results])
+
+
+if __name__ == "__main__":
+    run(*[int(x) for x in sys.argv[1:]])
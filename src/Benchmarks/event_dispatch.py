@@ -0,0 +1,122 @@
+'''
+    Event allocation and dispatch microbenchmark
+
+    before - plain __dict__ events with a payload dict, dispatched through an if/elif chain of string comparisons
+             (how events were modeled before Messages)
+    after - __slots__ events with typed payload records, dispatched through an opcode table
+
+    run from src: python -m Benchmarks.event_dispatch [num_events]
+'''
+import sys
+import time
+import tracemalloc
+
+import Chain.Messages as Messages
+
+from Chain.Event import Event
+
+TYPES = ["pre_prepare", "prepare", "commit", "new_block", "timeout"]
+RECORDS = [Messages.PrePrepare, Messages.Prepare, Messages.Commit, Messages.NewBlock]
+
+########################## BEFORE ###########################
+
+class DictEvent():
+    def __init__(self, handler, creator, time, payload, id=-1) -> None:
+        self.id = id
+        self.handler = handler
+        self.creator = creator
+        self.time = time
+        self.payload = payload
+        self.actor = creator
+
+
+def chain_dispatch(event):
+    if event.payload['type'] == 'pre_prepare':
+        return 0
+    elif event.payload['type'] == 'prepare':
+        return 1
+    elif event.payload['type'] == 'commit':
+        return 2
+    elif event.payload['type'] == 'timeout':
+        return 3
+    elif event.payload['type'] == 'new_block':
+        return 4
+    else:
+        return 'unhadled'
+
+
+def before(num_events):
+    events = []
+    for i in range(num_events):
+        t = TYPES[i % len(TYPES)]
+        if t == 'timeout':
+            payload = {'type': t, 'round': i, 'CP': 'PBFT'}
+        else:
+            payload = {'type': t, 'block': None, 'round': i, 'CP': 'PBFT'}
+        events.append(DictEvent(chain_dispatch, None, float(i), payload, i))
+
+    for e in events:
+        e.handler(e)
+
+    return events
+
+########################## AFTER ###########################
+
+TABLE = Messages.dispatch_table({
+    Messages.PRE_PREPARE: lambda e: 0,
+    Messages.PREPARE: lambda e: 1,
+    Messages.COMMIT: lambda e: 2,
+    Messages.TIMEOUT: lambda e: 3,
+    Messages.NEW_BLOCK: lambda e: 4,
+})
+
+
+def table_dispatch(event):
+    handler = TABLE[event.payload.TYPE]
+
+    if handler is None:
+        return 'unhadled'
+
+    return handler(event)
+
+
+def after(num_events):
+    events = []
+    for i in range(num_events):
+        k = i % len(TYPES)
+        if k == 4:
+            payload = Messages.Timeout(i)
+        else:
+            payload = RECORDS[k](None, i)
+        payload.CP = 'PBFT'
+        events.append(Event(table_dispatch, None, float(i), payload, i))
+
+    for e in events:
+        e.handler(e)
+
+    return events
+
+########################## MEASURE ###########################
+
+def measure(f, num_events):
+    t = time.perf_counter()
+    f(num_events)
+    elapsed = time.perf_counter() - t
+
+    tracemalloc.start()
+    events = f(num_events)
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del events
+
+    return elapsed, memory
+
+
+def run(num_events=200_000):
+    for name, f in (("before", before), ("after", after)):
+        elapsed, memory = measure(f, num_events)
+        print(f"{name:>7}: {num_events / elapsed:>12,.0f} events/sec | {memory / num_events:>6.0f} bytes/event")
+
+
+if __name__ == "__main__":
+    run(*[int(x) for x in sys.argv[1:]])
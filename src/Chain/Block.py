@@ -1,52 +1,71 @@
 import random
-import copy
+
+from types import MappingProxyType
+
+# block ids are 32 bit - the n-th id of a simulation is mix(n + key) (see Block.next_id)
+_MASK = 0xFFFFFFFF
+_M1, _M2 = 0x7feb352d, 0x846ca68b
+
+
+def mix(x):
+    '''
+        bijective 32 bit integer hash (lowbias32) - distinct inputs give distinct, well spread outputs
+    '''
+    x ^= x >> 16
+    x = (x * _M1) & _MASK
+    x ^= x >> 15
+    x = (x * _M2) & _MASK
+    x ^= x >> 16
+    return x
+
 
 class Block:
     '''
         Defines the block - a basic component of the blockchain
+
+        Blocks are immutable once proposed and shared by every node that adds them
+        (per node data - e.g the time the block was added - is kept by the node see ChainStore.times)
+
+        Block ids are collision free: the n-th id of a simulation is a bijective hash of n (see next_id)
+        so ids look random (the BigFoot leader is last_block.id % Nn) but never repeat.
+
+        extra_data (CP data - e.g proposer and round) is given when the block is created and read only after
     '''
+    # id sequence of the current simulation (started by genesis_block)
+    _key = 0
+    _next = 0
+
     def __init__(self, depth=0, id=0, previous=-1,
-                 time_created=0, miner=None, transactions=[], size=1.0, consensus=None):
+                 time_created=0, miner=None, transactions=[], size=1.0, consensus=None, extra_data=None):
         
         self.depth = depth
         self.id = id
         self.previous = previous
         self.time_created = time_created
-        self.time_added = 0
         self.miner = miner
         self.transactions = transactions
         self.size = size
 
         self.consensus = consensus
 
-        self.extra_data = {}
+        self.extra_data = MappingProxyType(dict(extra_data or {}))
+
+        # record of the block in the chain archive (None until spilled - see ChainStore)
+        self.record = None
 
     def __str__(self) -> str:
-        return f"~block: {self.id} | depth: {self.depth} | created/added: {round(self.time_created,2)}/{round(self.time_added,2)} | size: {round(self.size,2)} | prev {self.previous} | {self.extra_data}~"
+        return f"~block: {self.id} | depth: {self.depth} | created: {round(self.time_created,2)} | size: {round(self.size,2)} | prev {self.previous} | {dict(self.extra_data)}~"
 
     def __repr__(self) -> str:
         return f"~block: {self.id}~"
 
-    def copy(self):
-        '''
-            Returns a copy of the block
-        '''
-        new_block = Block(self.depth, self.id, self.previous, self.time_created,
-                          self.miner, self.transactions, self.size, self.consensus)
-                          
-        new_block.extra_data = copy.copy(self.extra_data)
-
-        new_block.time_added = self.time_added
-
-        return new_block
-
-    def to_serializable(self):
+    def to_serializable(self, time_added):
         return {
             "id": self.id,
             "depth": self.depth,
             "previous": self.previous,
             "time_created": self.time_created,
-            "time_added": self.time_added,
+            "time_added": time_added,
             "miner": self.miner,
             "consensus": self.consensus.NAME,
             "size": self.size,
@@ -54,9 +73,22 @@ class Block:
             "transactions": [x for x in self.transactions]
         }
     
+    @staticmethod
+    def next_id():
+        '''
+            returns a new (unique) id
+        '''
+        id = mix((Block._next + Block._key) & _MASK)
+        Block._next += 1
+
+        return id
+
     @staticmethod
     def genesis_block():
         '''
-            Generates the gensis block
+            Generates the gensis block - starting a new id sequence
         '''
-        return Block(0, random.randint(0, 10_000), size=0)
\ No newline at end of file
+        Block._key = random.getrandbits(32)
+        Block._next = 0
+
+        return Block(0, Block.next_id(), size=0)
\ No newline at end of file
@@ -0,0 +1,269 @@
+'''
+    Chain store - the blockchain of a node (Node.blockchain) keeping only the last K blocks in memory
+
+    Blocks that fall out of the resident window are spilled to the BlockArchive - a pair of append-only files
+    shared by all nodes (blocks are shared between nodes so each block is written once):
+        headers - one fixed width record per block (HEADER)
+        transactions - the ids of the transactions of every block (a block's ids are headers[tx_start:tx_start+tx_count])
+    Both files are read through numpy memory maps. Spilled blocks are rebuilt on access (the transactions
+    are rebuilt from the shared mempool) so the store reads like a list of blocks - index = depth.
+    Blocks can also be looked up by id (find - id -> depth map of the node)
+
+    Config (simulation.chain_store):
+        resident - number of blocks kept in memory by each node (null - keep every block in memory)
+        dir - directory of the archive files (null - anonymous temporary files removed at exit)
+'''
+from Chain.Block import Block
+from Chain.Parameters import Parameters
+
+from array import array
+
+import numpy as np
+import tempfile
+import os
+
+
+class BlockArchive:
+    '''
+        Append-only on-disk store of spilled blocks (shared by all nodes)
+    '''
+    HEADER = np.dtype([
+        ("depth", np.int64),
+        ("id", np.int64),
+        ("previous", np.int64),
+        ("time_created", np.float64),
+        ("miner", np.int64),
+        ("size", np.float64),
+        ("consensus", np.int16),
+        ("round", np.int64),
+        ("tx_start", np.int64),
+        ("tx_count", np.int64),
+    ])
+
+    def __init__(self, directory=None):
+        if directory is None:
+            self.header_file = tempfile.TemporaryFile()
+            self.tx_file = tempfile.TemporaryFile()
+        else:
+            os.makedirs(directory, exist_ok=True)
+            self.header_file = open(os.path.join(directory, "headers.bin"), "w+b")
+            self.tx_file = open(os.path.join(directory, "transactions.bin"), "w+b")
+
+        self.count = 0
+        self.tx_count = 0
+
+        # CP module of each consensus index (-1: no CP - the genesis block)
+        self.consensus = []
+
+        # memory maps of the files (remapped after the next write)
+        self.headers = None
+        self.txs = None
+
+    def store(self, block):
+        '''
+            writes block to the archive (once) and returns its record
+        '''
+        if block.record is not None:
+            return block.record
+
+        if block.consensus is None:
+            consensus = -1
+        else:
+            if block.consensus not in self.consensus:
+                self.consensus.append(block.consensus)
+            consensus = self.consensus.index(block.consensus)
+
+        tx_ids = np.fromiter((tx.id for tx in block.transactions), dtype=np.int64, count=len(block.transactions))
+
+        header = np.array([(
+            block.depth, block.id, block.previous, block.time_created,
+            -1 if block.miner is None else block.miner, block.size,
+            consensus, block.extra_data.get("round", -1),
+            self.tx_count, len(tx_ids),
+        )], dtype=BlockArchive.HEADER)
+
+        header.tofile(self.header_file)
+        tx_ids.tofile(self.tx_file)
+
+        self.headers = self.txs = None
+
+        block.record = self.count
+        self.count += 1
+        self.tx_count += len(tx_ids)
+
+        return block.record
+
+    def map(self):
+        '''
+            maps the files into memory (after flushing pending writes)
+        '''
+        if self.headers is None:
+            self.header_file.flush()
+            self.tx_file.flush()
+
+            self.headers = np.memmap(self.header_file, dtype=BlockArchive.HEADER, mode='r', shape=(self.count,))
+            self.txs = np.memmap(self.tx_file, dtype=np.int64, mode='r', shape=(self.tx_count,)) \
+                if self.tx_count else np.empty(0, dtype=np.int64)
+
+    def load(self, record):
+        '''
+            rebuilds the block stored at record
+        '''
+        self.map()
+        h = self.headers[record]
+
+        mempool = Parameters.simulation["txion_model"].mempool
+        start = int(h["tx_start"])
+        transactions = [mempool[int(i)] for i in self.txs[start:start + int(h["tx_count"])]]
+
+        consensus = None if h["consensus"] < 0 else self.consensus[h["consensus"]]
+        miner = None if h["miner"] < 0 else int(h["miner"])
+
+        extra_data = None if consensus is None else {'proposer': miner, 'round': int(h["round"])}
+
+        block = Block(int(h["depth"]), int(h["id"]), int(h["previous"]), float(h["time_created"]),
+                      miner, transactions, float(h["size"]), consensus, extra_data)
+
+        block.record = record
+
+        return block
+
+    def close(self):
+        self.headers = self.txs = None
+        self.header_file.close()
+        self.tx_file.close()
+
+
+class ChainStore:
+    '''
+        The blockchain of a node - the last 'resident' blocks in memory, older blocks in the archive
+
+        base - store whose first 'base_length' blocks are the first blocks of this one (a node joining through
+               a snapshot reads the history through the store it got it from - see prefix)
+        blocks - resident blocks (blocks[head:] - the spilled prefix is trimmed every _TRIM blocks)
+        records - archive records of the spilled blocks
+        sizes - size of every block (used to size range transfers see HighLevelSync)
+        times - time the node added every block
+        depths - id -> depth of the blocks after the base (find falls back to the base for the shared history)
+        (records, sizes and times only cover the blocks after the base - index = depth - base_length)
+    '''
+    _TRIM = 4096
+
+    # set up from simulation.chain_store (see init)
+    archive = None
+    resident = None
+
+    def __init__(self, base=None, base_length=0):
+        self.base = base
+        self.base_length = base_length
+
+        self.blocks = []
+        self.head = 0
+        self.records = array('q')
+        self.sizes = array('d')
+        self.times = array('d')
+        self.depths = {}
+
+    @staticmethod
+    def init(params):
+        '''
+            sets up the store described by simulation.chain_store
+        '''
+        if ChainStore.archive is not None:
+            ChainStore.archive.close()
+            ChainStore.archive = None
+
+        ChainStore.resident = params["resident"]
+
+        if ChainStore.resident is not None:
+            if ChainStore.resident < 1:
+                raise ValueError(f"chain_store.resident must be at least 1 (got {ChainStore.resident})")
+
+            ChainStore.archive = BlockArchive(params["dir"])
+
+    def __len__(self):
+        return self.base_length + len(self.sizes)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError("chain index out of range")
+
+        if i < self.base_length:
+            return self.base[i]
+        i -= self.base_length
+
+        spilled = len(self.records)
+        if i >= spilled:
+            return self.blocks[self.head + i - spilled]
+
+        return ChainStore.archive.load(self.records[i])
+
+    def _column(self, name, start, end):
+        '''
+            values of column 'name' (sizes / times) of the blocks at depths [start, end)
+        '''
+        own = np.array(getattr(self, name)[max(start - self.base_length, 0):max(end - self.base_length, 0)])
+
+        if start >= self.base_length:
+            return own
+
+        return np.concatenate((self.base._column(name, start, min(end, self.base_length)), own))
+
+    def find(self, id):
+        '''
+            depth of the block with the given id in this chain (None if the chain does not contain it)
+        '''
+        depth = self.depths.get(id)
+
+        if depth is None and self.base is not None:
+            depth = self.base.find(id)
+
+            # the base may have grown past the shared history
+            if depth is not None and depth >= self.base_length:
+                depth = None
+
+        return depth
+
+    def sizes_from(self, start):
+        return self._column("sizes", start, len(self))
+
+    def times_from(self, start):
+        return self._column("times", start, len(self))
+
+    def append(self, block, time):
+        self.depths[block.id] = len(self)
+        self.blocks.append(block)
+        self.sizes.append(block.size)
+        self.times.append(time)
+
+        if ChainStore.resident is not None and len(self.blocks) - self.head > ChainStore.resident:
+            self.records.append(ChainStore.archive.store(self.blocks[self.head]))
+            self.blocks[self.head] = None
+            self.head += 1
+
+            if self.head >= ChainStore._TRIM:
+                del self.blocks[:self.head]
+                self.head = 0
+
+    def prefix(self, length):
+        '''
+            new store whose first 'length' blocks are the first blocks of this one - O(1), nothing is copied
+            (chains only grow so the blocks below 'length' never change - they are read through this store)
+        '''
+        if self.base is not None and length <= self.base_length:
+            return self.base.prefix(length)
+
+        return ChainStore(self, length)
+
+    def extend(self, blocks, times):
+        for block, time in zip(blocks, times):
+            self.append(block, time)
@@ -8,20 +8,22 @@
         fast_path - boolean value determining wether the node is in the fast path or not 
         state - BigFoot node state (new_round, pre-prepared, prepared, committed)]
         msgs: list of messages received from other nodes
-        timeout - reference to latest timeout event (when node state updates it is used to find event and delte from event queue)
-        fast_path_timeout - reference to fast_path_timeout event
+        timeout - handle of the latest timeout event (when node state updates it is used to cancel the event)
+        fast_path_timeout - handle of the fast_path_timeout event
         block -  the proposed block in current round
 '''
 
 from Chain.Block import Block
 from Chain.Parameters import Parameters
 
+import Chain.Messages as Messages
+
 import Chain.Consensus.Rounds as Rounds
 import Chain.Consensus.HighLevelSync as Sync
+import Chain.Consensus.VoteAggregation as VoteAggregation
 
 from types import SimpleNamespace
 
-from random import randint
 from sys import modules
 
 NAME = "BigFoot"
@@ -39,6 +41,7 @@ def set_state(node):
         miner="",
         msgs={'prepare': [], 'commit': []},
         timeout=None,
+        quorums={},
         fast_path_timeout=None,
         block=None,
     )
@@ -72,31 +75,28 @@ def create_BigFoot_block(node, time):
     # create block according to CP
     block = Block(
         depth=len(node.blockchain),
-        id=randint(1, 10000),
+        id=Block.next_id(),
         previous=node.last_block.id,
         time_created=time,
         miner=node.id,
-        consensus=modules[__name__]
+        consensus=modules[__name__],
+        extra_data={'proposer': node.id,
+                    "round": node.state.cp_state.round.round}
     )
-    block.extra_data = {'proposer': node.id,
-                        "round": node.state.cp_state.round.round}
 
     # add transactions to the block
-    # get current transaction from transaction pool and timeout time
-    current_pool = [t for t in node.pool if t.timestamp <= time]
+    # get the timeout time
     timeout_time = node.state.cp_state.timeout.time
 
     # while the pool is empty and the current time is less than the timeout wait for transactions to be added to the pool
-    # basically the transactions are there - the nodes check when the first transaction in time apears and forwards the clock to that time
-    # if not txions are found before the round timesout, we return -1 and let the block proposal timeout
-
-    while not current_pool and time + 1 < timeout_time:
-        time += 1
-        current_pool = [t for t in node.pool if t.timestamp <= time]
+    # ( basically the transactions are there - the nodes check when the first transaction in time apears and forwards the clock to that time
+    # if not txions are found before the round times out, we return -1 and let the block proposal timeout
+    time = node.pool.wait(time, timeout_time)
 
-    if current_pool and time < timeout_time:
+    if time != -1 and time < timeout_time:
         block.transactions, block.size = Parameters.simulation["txion_model"].execute_transactions(
-            current_pool)
+            node.pool, time)
+
         return block, time
     else:
         return -1, -1
@@ -106,30 +106,52 @@ def create_BigFoot_block(node, time):
 
 
 def handle_event(event):  # specific to BigFoot - called by events in Handler.handle_event()
-    if event.payload['type'] == 'pre_prepare':
-        return pre_prepare(event)
-    elif event.payload['type'] == 'prepare':
-        return prepare(event)
-    elif event.payload['type'] == 'commit':
-        return commit(event)
-    elif event.payload['type'] == 'timeout' or event.payload['type'] == "fast_path_timeout":
-        return timeout(event)
-    elif event.payload['type'] == 'new_block':
-        return new_block(event)
-    else:
+    handler = HANDLERS[event.payload.TYPE]
+
+    if handler is None:
         return 'unhadled'
 
+    return handler(event)
+
 ########################## PROTOCOL COMMUNICATION ###########################
 
 def process_vote(node, type, sender):
     # BigFoot does not allow for mutliple blocks to be submitted in 1 round
     node.state.cp_state.msgs[type] += [sender.id]
 
+def process_votes(node, type, event):
+    # an aggregated vote (see VoteAggregation) carries the votes of several nodes
+    for sender in VoteAggregation.voters(event):
+        process_vote(node, type, sender)
+
+def broadcast_vote(node, time, payload):
+    # prepare/commit votes are aggregated into quorum events if enabled (see VoteAggregation)
+    if VoteAggregation.active(Parameters.BigFoot):
+        VoteAggregation.broadcast(node, time, payload, handle_event, vote_thresholds)
+    else:
+        node.scheduler.schedule_broadcast_message(
+            node, time, payload, handle_event)
+
+def vote_thresholds(receiver, payload):
+    '''
+        votes from other nodes receiver needs to move on in a vote phase (used when aggregating votes)
+            prepare: required_messages - 1 (slow path) and Nn - 1 (fast path) - the proposer does not vote
+                     and the other nodes count their own vote
+            commit: required_messages - 1 (every node counts its own vote)
+    '''
+    required = Parameters.application["required_messages"]
+    own = receiver.id != payload.block.miner
+
+    if payload.TYPE == Messages.PREPARE:
+        return (required - 1 - own, Parameters.application["Nn"] - 1 - own)
+
+    return (required - 1,)
+
 def pre_prepare(event):
     node = event.receiver
     time = event.time
     state = node.state.cp_state
-    block = event.payload['block']
+    block = event.payload.block
 
     time += Parameters.execution["msg_val_delay"]
 
@@ -140,19 +162,14 @@ def pre_prepare(event):
             time += Parameters.execution["block_val_delay"]
 
             # store block as current block
-            state.block = event.payload['block'].copy()
+            state.block = event.payload.block
 
             # change state to pre_prepared since block was accepted
             state.state = 'pre_prepared'
 
             # broadcast preare message
-            payload = {
-                'type': 'prepare',
-                'block': state.block,
-                'round': state.round.round,
-            }
-            node.scheduler.schedule_broadcast_message(
-                node, time, payload, handle_event)
+            payload = Messages.Prepare(state.block, state.round.round)
+            broadcast_vote(node, time, payload)
 
             # count own vote
             process_vote(node, 'prepare', node)
@@ -171,13 +188,13 @@ def prepare(event):
     node = event.receiver
     time = event.time
     state = node.state.cp_state
-    block = event.payload['block']
+    block = event.payload.block
     
     time += Parameters.execution["msg_val_delay"]
 
     if state.state == 'pre_prepared':        
         # count prepare votes from other nodes
-        process_vote(node, 'prepare', event.creator)
+        process_votes(node, 'prepare', event)
 
         # if we have enough prepare messages
         if not state.fast_path:
@@ -187,13 +204,8 @@ def prepare(event):
                 state.state = 'prepared'
 
                 # send commit message
-                payload = {
-                    'type': 'commit',
-                    'block': block,
-                    'round': state.round.round,
-                }
-                node.scheduler.schedule_broadcast_message(
-                    node, time, payload, handle_event)
+                payload = Messages.Commit(block, state.round.round)
+                broadcast_vote(node, time, payload)
 
                 # count own vote
                 process_vote(node, 'commit', node)
@@ -202,16 +214,12 @@ def prepare(event):
             # leader does not issue a prepare message
             if len(state.msgs['prepare']) == Parameters.application["Nn"]-1:
                 if state.block is None:
-                    state.block = block.copy()
+                    state.block = block
 
                 node.add_block(state.block, time)
 
                 if node == state.miner:
-                    payload = {
-                        'type': 'new_block',
-                        'block': block,
-                        'round': state.round.round,
-                    }
+                    payload = Messages.NewBlock(block, state.round.round)
 
                     node.scheduler.schedule_broadcast_message(
                         node, time, payload, handle_event)
@@ -229,17 +237,17 @@ def prepare(event):
         # enough it will, depending on the reason do the following:
         # 1) (node timed out) will accept block and keep working as normal
         # 2) (node though block was invalid) try to sync using block_data else request sync
-        process_vote(node, 'prepare', event.creator)
+        process_votes(node, 'prepare', event)
         
         # if we have enough prepare messages (-1 for leader -1 for slef)
         if len(state.msgs['prepare']) >= Parameters.application["required_messages"] - 2:
             time += Parameters.execution["block_val_delay"]
 
             if block.depth -1 == node.last_block.depth:
-                state.round.round = event.payload['round']
+                state.round.round = event.payload.round
 
                 # store block as current block
-                state.block = event.payload['block'].copy()
+                state.block = event.payload.block
                 block = state.block
 
                 # change state to pre_prepared since block was accepted
@@ -247,13 +255,8 @@ def prepare(event):
                 state.block = block
 
                 # broadcast preare message
-                payload = {
-                    'type': 'prepare',
-                    'block': block,
-                    'round': state.round.round,
-                }
-                node.scheduler.schedule_broadcast_message(
-                    node, time, payload, handle_event)
+                payload = Messages.Prepare(block, state.round.round)
+                broadcast_vote(node, time, payload)
 
                 # count own vote
                 process_vote(node, 'prepare', node)
@@ -274,33 +277,24 @@ def commit(event):
     node = event.receiver
     time = event.time
     state = node.state.cp_state
-    block = event.payload['block'].copy()
+    block = event.payload.block
     
     time += Parameters.execution["msg_val_delay"]
 
     # if prepared
     if state.state == 'prepared':
-        process_vote(node, 'commit', event.creator)
+        process_votes(node, 'commit', event)
 
         if len(state.msgs['commit']) >= Parameters.application["required_messages"]:
-            payload = {
-                'type': 'commit',
-                'block': block,
-                'round': state.round.round,
-            }
-            node.scheduler.schedule_broadcast_message(
-                node, time, payload, handle_event)
+            payload = Messages.Commit(block, state.round.round)
+            broadcast_vote(node, time, payload)
 
             process_vote(node, 'commit', node)
 
             node.add_block(state.block, time)
 
             if node == state.miner:
-                payload = {
-                    'type': 'new_block',
-                    'block': block,
-                    'round': state.round.round,
-                }
+                payload = Messages.NewBlock(block, state.round.round)
 
                 node.scheduler.schedule_broadcast_message(
                     node, time, payload, handle_event)
@@ -318,43 +312,32 @@ def commit(event):
         # Node will count the messages and if it receieves enough it will depending on the reason do the following:
         # 1) (node timed out) will accept block and keep working as normal
         # 2) (node though block was invalid) try to sync using block_data else initialise sync
-        process_vote(node, 'commit', event.creator)
+        process_votes(node, 'commit', event)
 
         # if we have enough commit messages (-1 for self)
         if len(state.msgs['commit']) >= Parameters.application["required_messages"] - 1:
             time += Parameters.execution["block_val_delay"]
 
             if block.depth -1 == node.last_block.depth:
-                state.round.round = event.payload['round']
+                state.round.round = event.payload.round
 
                 # try to correct round
-                if state.round.round < event.payload['round']:
-                    state.round.round = event.payload['round']
+                if state.round.round < event.payload.round:
+                    state.round.round = event.payload.round
 
                 if state.block is None:
-                    state.block = block.copy()
+                    state.block = block
 
                 # send commit message (since now node agrees that this block should be commited)
-                payload = {
-                    'type': 'commit',
-                    'block': block,
-                    'round': state.round.round,
-                }
-                node.scheduler.schedule_broadcast_message(
-                    node, time, payload, handle_event)
+                payload = Messages.Commit(block, state.round.round)
+                broadcast_vote(node, time, payload)
 
                 process_vote(node, 'commit', node)
 
-                block.extra_data["votes"] = node.state.cp_state.msgs
-
                 # send new block message since we have received enough commit messages
                 node.add_block(block, time)
 
-                payload = {
-                    'type': 'new_block',
-                    'block': block,
-                    'round': state.round.round,
-                }
+                payload = Messages.NewBlock(block, state.round.round)
                 node.scheduler.schedule_broadcast_message(
                     node, time, payload, handle_event)
 
@@ -374,7 +357,7 @@ def commit(event):
 
 def new_block(event):
     node = event.receiver
-    block = event.payload['block']
+    block = event.payload.block
     time = event.time
 
     time += Parameters.execution["msg_val_delay"] + Parameters.execution["block_val_delay"]
@@ -394,12 +377,12 @@ def new_block(event):
         # Valid block (we assume message + block are valid)
         # correct round - since message is valid and contains validator votes then if this is a future round
         # node did not participate in the CP (likely to have just recieved sync but missed a round-change)
-        if event.payload['round'] > node.state.cp_state.round.round:
+        if event.payload.round > node.state.cp_state.round.round:
             node.state.cp_state.round.round
 
         # add block and start new round
         node.add_block(block, time)
-        start(node, event.payload['round']+1, time)
+        start(node, event.payload.round+1, time)
         return "handled"
 
 ########################## ROUND CHANGE ###########################
@@ -417,9 +400,10 @@ def start(node, new_round, time):
     state.state = 'new_round'
     state.fast_path = True
 
-    node.backlog = []
+    node.backlog.clear()
 
     reset_msgs(node)
+    VoteAggregation.prune(node, new_round)
 
     state.round.round = new_round
     state.block = None
@@ -438,13 +422,9 @@ def start(node, new_round, time):
             return 0
 
         state.state = 'pre_prepared'
-        state.block = block.copy()
+        state.block = block
 
-        payload = {
-            'type': 'pre_prepare',
-            'block': block,
-            'round': new_round,
-        }
+        payload = Messages.PrePrepare(block, new_round)
 
         node.scheduler.schedule_broadcast_message(
             node, creation_time, payload, handle_event)
@@ -462,8 +442,8 @@ def timeout(event):
     if not node.state.synced:
         pass
 
-    if event.payload['round'] == node.state.cp_state.round.round:
-        if event.payload['type'] == "fast_path_timeout":
+    if event.payload.round == node.state.cp_state.round.round:
+        if event.payload.TYPE == Messages.FAST_PATH_TIMEOUT:
             state = node.state.cp_state
             time = event.time
 
@@ -481,13 +461,8 @@ def timeout(event):
                 state.state = 'prepared'
 
                 # send commit message
-                payload = {
-                    'type': 'commit',
-                    'block': state.block,
-                    'round': state.round.round,
-                }
-                node.scheduler.schedule_broadcast_message(
-                    node, time, payload, handle_event)
+                payload = Messages.Commit(state.block, state.round.round)
+                broadcast_vote(node, time, payload)
 
                 # count own vote
                 process_vote(node, 'commit', node)
@@ -517,36 +492,24 @@ def schedule_timeout(node, time, remove=True, add_time=True, fast_path=False):
         node.state.fast_path = True
 
         if node.state.cp_state.fast_path_timeout is not None:
-            try:
-                node.remove_event(node.state.cp_state.fast_path_timeout)
-            except ValueError:
-                pass
+            node.state.cp_state.fast_path_timeout.cancel()
 
         if add_time:
             time += float(Parameters.BigFoot["fast_path_timeout"])
 
-        payload = {
-            'type': 'fast_path_timeout',
-            'round': node.state.cp_state.round.round,
-        }
+        payload = Messages.FastPathTimeout(node.state.cp_state.round.round)
         event = node.scheduler.schedule_event(
             node, time, payload, handle_event)
 
         node.state.cp_state.fast_path_timeout = event
     else:
         if node.state.cp_state.timeout is not None and remove:
-            try:
-                node.remove_event(node.state.cp_state.timeout)
-            except ValueError:
-                pass
+            node.state.cp_state.timeout.cancel()
 
         if add_time:
             time += float(Parameters.BigFoot['timeout'])
 
-        payload = {
-            'type': 'timeout',
-            'round': node.state.cp_state.round.round,
-        }
+        payload = Messages.Timeout(node.state.cp_state.round.round)
 
         event = node.scheduler.schedule_event(
             node, time, payload, handle_event)
@@ -561,8 +524,8 @@ def resync(node, payload, time):
         BigFoot specific resync actions
     '''
     set_state(node)
-    if node.state.cp_state.round.round < payload['blocks'][-1].extra_data['round']:
-        node.state.cp_state.round.round = payload['blocks'][-1].extra_data['round']
+    if node.state.cp_state.round.round < payload.blocks[-1].extra_data['round']:
+        node.state.cp_state.round.round = payload.blocks[-1].extra_data['round']
 
     schedule_timeout(node, time=time)
 
@@ -570,6 +533,23 @@ def resync(node, payload, time):
 
 
 def clean_up(node):
-    for event in node.queue.event_list:
-        if event.payload["CP"] == NAME:
-            node.queue.remove_event(event)
+    node.queue.cancel_where(lambda event: event.payload.CP == NAME)
+
+########################## DISPATCH TABLE ###########################
+
+# opcode -> handler (defined last since it references the handlers above)
+HANDLERS = Messages.dispatch_table({
+    Messages.PRE_PREPARE: pre_prepare,
+    Messages.PREPARE: prepare,
+    Messages.COMMIT: commit,
+    Messages.TIMEOUT: timeout,
+    Messages.FAST_PATH_TIMEOUT: timeout,
+    Messages.NEW_BLOCK: new_block,
+})
+
+# opcodes of the backlogged events that may be handled once a node enters a state (see Handler.handle_backlog)
+BACKLOG_READY = {
+    'pre_prepared': (Messages.PREPARE,),
+    'prepared': (Messages.COMMIT,),
+    'round_change': (Messages.PREPARE, Messages.COMMIT),
+}
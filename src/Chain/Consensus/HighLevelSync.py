@@ -2,64 +2,66 @@
     Models a high-level sync functionality. Caclulates how long it would take for the node to receive the data
     (missing blocks) and creats a local event which copies the missing blocks to the desynced node saving communication
     events
+
+    Snapshot sync (simulation.join_sync.mode: snapshot) - a node joining through Manager.add_node receives a
+    checkpoint (the tip block of the request node and its pool state) instead of every block. The transfer costs
+    the tip plus join_sync.snapshot_size and the history is shared with the request node without copying (see ChainStore.prefix)
 '''
 
 from Chain.Network import Network
 from Chain.Parameters import Parameters
 
+import Chain.Messages as Messages
+
 import Chain.tools as tools
 
+import numpy as np
+
 from random import randint, sample
 
 
 def handler(event):
-    if event.payload["type"] == "local_fast_sync":
-        return handle_local_sync_event(event)
-    else:
+    handle = HANDLERS[event.payload.TYPE]
+
+    if handle is None:
         return "unhadled"
 
+    return handle(event)
+
 
 def create_local_sync_event(desynced_node, request_node, time):
     '''
         get missing blocks from request node
         (node from which we request missing blocks i.e node whos message made us know we are desynced)
         Calculate transmission + validation delay and create local sync event after
+
+        The missing blocks are transferred as one range: sum(sizes) / bandwidth plus the overhead of one request
+        (latency, validation and request delays). Blocks are shared so only references are handed over
     '''
-    latest_block = desynced_node.last_block
-    missing_blocks = [b.copy() for b in request_node.blockchain if b.depth > latest_block.depth]    
+    start = desynced_node.last_block.depth + 1
+    missing_blocks = request_node.blockchain[start:]
 
-    total_delay = 0    
-    
-    for i, b in enumerate(missing_blocks):
-        delay_network = Network.calculate_message_propagation_delay(
-            request_node, desynced_node, b.size)
-        
-        delay = delay_network + Parameters.execution["block_val_delay"] + Parameters.execution["sync_message_request_delay"]
+    sizes = request_node.blockchain.sizes_from(start)
+    bandwidth = Network.get_bandwidth(request_node, desynced_node)
+
+    overhead = Network.calculate_message_propagation_delay(request_node, desynced_node, 0) + \
+        Parameters.execution["block_val_delay"] + Parameters.execution["sync_message_request_delay"]
 
-        total_delay += delay    
+    delay = sizes.sum() / bandwidth + overhead
 
-        missing_blocks[i].time_added += delay
+    # each block is added to the desynced node its transfer time after it was added to the request node
+    times_added = request_node.blockchain.times_from(start) + sizes / bandwidth + overhead
 
     missbehave_delay, missbehaviour = apply_sync_missbehaiviour(request_node)
     
     # create local sync event on desynced_node after delay
     if missbehaviour:
-        payload = {
-            "request_node": request_node,
-            "type": 'local_fast_sync',
-            "blocks": None,
-            "fail": True,
-        }
+        payload = Messages.LocalSync(request_node, None, None, True)
 
         desynced_node.scheduler.schedule_event(
             desynced_node, time+missbehave_delay, payload, handler, queue="sync")
     else:
-        payload = {
-            "request_node": request_node,
-            "type": 'local_fast_sync',
-            "blocks": missing_blocks,
-            "fail": False,
-        }
+        payload = Messages.LocalSync(request_node, missing_blocks, times_added, False)
 
         desynced_node.scheduler.schedule_event(
             desynced_node, time+delay, payload, handler, queue="sync")
@@ -71,32 +73,97 @@ def handle_local_sync_event(event):
     '''
     node = event.creator
 
-    if event.payload['fail']:
+    if event.payload.fail:
         # if the previous request failed - request data from a random neighbour
         create_local_sync_event(node, sample(node.neighbours, 1)[0], event.time)
     else:
-        received_blocks = event.payload['blocks']
-        for b in received_blocks:
+        received_blocks = event.payload.blocks
+
+        if received_blocks:
             # there is a chance the node was updated before this message made it to them 
-            # so checking to not add repeat blocks
-            if b.depth == node.blockchain[-1].depth + 1:
-                node.blockchain.append(b)
-        
-        # while the node is desynced keep asking for blocks
-        if node.last_block.depth < event.payload["request_node"].last_block.depth:
-            create_local_sync_event(node, event.payload["request_node"], event.time)
-            return 0
+            # so skipping the blocks the node allready has (the range is contiguous)
+            skip = node.last_block.depth + 1 - received_blocks[0].depth
 
-        # adds time of final check
-        event.time += Parameters.execution["sync_message_request_delay"]
+            node.blockchain.extend(received_blocks[skip:], event.payload.times_added[skip:])
 
-        node.state.synced = True
+            # the transactions of the received blocks are no longer pending for this node
+            for block in received_blocks[skip:]:
+                node.pool.commit(block.transactions)
 
-        if received_blocks:
-            received_blocks[-1].consensus.resync(node, event.payload, event.time)
-        
-        if node.update(event.time):
-            return 0
+        return complete_sync(event)
+
+
+def create_snapshot_sync_event(desynced_node, request_node, time):
+    '''
+        sends the checkpoint of request node (tip block + pool state) to desynced node
+        the transfer time does not depend on the height of the chain
+    '''
+    tip = request_node.last_block
+
+    missbehave_delay, missbehaviour = apply_sync_missbehaiviour(request_node)
+
+    if missbehaviour:
+        payload = Messages.SnapshotSync(request_node, None, None, True)
+
+        desynced_node.scheduler.schedule_event(
+            desynced_node, time+missbehave_delay, payload, handler, queue="sync")
+    else:
+        delay = Network.calculate_message_propagation_delay(
+            request_node, desynced_node, tip.size + Parameters.simulation["join_sync"]["snapshot_size"])
+
+        delay += Parameters.execution["block_val_delay"] + Parameters.execution["sync_message_request_delay"]
+
+        payload = Messages.SnapshotSync(request_node, [tip], request_node.pool.copy(), False)
+
+        desynced_node.scheduler.schedule_event(
+            desynced_node, time+delay, payload, handler, queue="sync")
+
+
+def handle_snapshot_sync_event(event):
+    '''
+        adopts the chain of the request node up to the checkpoint (sharing its blocks) and the pool state
+        the blocks added after the checkpoint are then synced as a range (see create_local_sync_event)
+    '''
+    node = event.creator
+    request_node = event.payload.request_node
+
+    if event.payload.fail:
+        create_snapshot_sync_event(node, sample(node.neighbours, 1)[0], event.time)
+        return 0
+
+    tip = event.payload.blocks[-1]
+
+    # the node reads the history of the request node through its store - the tip is added now
+    node.blockchain = request_node.blockchain.prefix(tip.depth)
+    node.blockchain.append(tip, event.time)
+
+    node.pool = event.payload.pool
+
+    return complete_sync(event)
+
+
+def complete_sync(event):
+    '''
+        keeps syncing while the node is behind the request node - otherwise marks it as synced and resyncs the CP
+    '''
+    node = event.creator
+
+    # while the node is desynced keep asking for blocks
+    if node.last_block.depth < event.payload.request_node.last_block.depth:
+        create_local_sync_event(node, event.payload.request_node, event.time)
+        return 0
+
+    # adds time of final check
+    event.time += Parameters.execution["sync_message_request_delay"]
+
+    node.state.synced = True
+
+    # (a node synced up to the genesis block has no CP to resync)
+    if event.payload.blocks and event.payload.blocks[-1].consensus is not None:
+        event.payload.blocks[-1].consensus.resync(node, event.payload, event.time)
+    
+    if node.update(event.time):
+        return 0
 
 def apply_sync_missbehaiviour(sender):
     '''
@@ -113,11 +180,17 @@ def apply_sync_missbehaiviour(sender):
             roll_type = randint(0, 100)
             if roll_type < 50:
                 ########### BAD DATA ############
-                tools.debug_logs(msg=f"node {sender} sent bad sync data!", col=47)
+                tools.debug_logs(msg=lambda: f"node {sender} sent bad sync data!", col=47)
                 delay = Parameters.behaiviour["sync"]["bad_data"]["delay"]
             else:
-                tools.debug_logs(msg=f"node {sender} did not respond to sync message!", col=47)
+                tools.debug_logs(msg=lambda: f"node {sender} did not respond to sync message!", col=47)
                 ########### NO RESPONSE #########
                 delay = Parameters.behaiviour["sync"]["no_response"]["delay"]
             return delay, True
     return 0, False
+
+# opcode -> handler (defined last since it references the handlers above)
+HANDLERS = Messages.dispatch_table({
+    Messages.LOCAL_FAST_SYNC: handle_local_sync_event,
+    Messages.SNAPSHOT_SYNC: handle_snapshot_sync_event,
+})
@@ -6,23 +6,23 @@
         change_to - canditate round to change to
         state - PBFT node state (new_round, pre-prepared, prepared, committed, round_change)]
         msgs: list of messages received from other nodes
-        timeout - reference to latest timeout event (when node state updates it is used to find event and delte from event queue)
+        timeout - handle of the latest timeout event (when node state updates it is used to cancel the event)
         block -  the current proposed block
 '''
 
 from Chain.Block import Block
 from Chain.Parameters import Parameters
 
+import Chain.Messages as Messages
+
 import Chain.Consensus.Rounds as Rounds
 import Chain.Consensus.HighLevelSync as Sync
+import Chain.Consensus.VoteAggregation as VoteAggregation
 
 from types import SimpleNamespace
 
-from random import randint
 from sys import modules
 
-from copy import copy
-
 ########################## PROTOCOL CHARACTERISTICS ###########################
 
 NAME = "PBFT"
@@ -37,6 +37,7 @@ def set_state(node):
         miner="",
         msgs={'prepare': [], 'commit': []},
         timeout=None,
+        quorums={},
         block=None,
     )
 
@@ -71,33 +72,29 @@ def create_PBFT_block(node, time):
     # create block according to CP
     block = Block(
         depth=len(node.blockchain),
-        id=randint(1, 10000),
+        id=Block.next_id(),
         previous=node.last_block.id,
         time_created=time,
         miner=node.id,
-        consensus=modules[__name__]
+        consensus=modules[__name__],
+        extra_data={
+            'proposer': node.id,
+            'round': node.state.cp_state.round.round
+        }
     )
-    block.extra_data = {
-        'proposer': node.id,
-        'round': node.state.cp_state.round.round
-    }
 
     # add transactions to the block
-    # get current transaction from transaction pool and timeout time
-    current_pool = [t for t in node.pool if t.timestamp <= time]
+    # get the timeout time
     timeout_time = node.state.cp_state.timeout.time
 
     # while the pool is empty and the current time is less than the timeout wait for transactions to be added to the pool
     # ( basically the transactions are there - the nodes check when the first transaction in time apears and forwards the clock to that time
     # if not txions are found before the round times out, we return -1 and let the block proposal timeout
+    time = node.pool.wait(time, timeout_time)
 
-    while not current_pool and time + 1 < timeout_time:
-        time += 1
-        current_pool = [t for t in node.pool if t.timestamp <= time]
-
-    if current_pool and time < timeout_time:
+    if time != -1 and time < timeout_time:
         block.transactions, block.size = Parameters.simulation["txion_model"].execute_transactions(
-            current_pool)
+            node.pool, time)
 
         return block, time
     else:
@@ -107,19 +104,13 @@ def create_PBFT_block(node, time):
 
 
 def handle_event(event):  # specific to PBFT - called by events in Handler.handle_event()
-    if event.payload['type'] == 'pre_prepare':
-        return pre_prepare(event)
-    elif event.payload['type'] == 'prepare':
-        return prepare(event)
-    elif event.payload['type'] == 'commit':
-        return commit(event)
-    elif event.payload['type'] == 'timeout':
-        return timeout(event)
-    elif event.payload['type'] == 'new_block':
-        return new_block(event)
-    else:
+    handler = HANDLERS[event.payload.TYPE]
+
+    if handler is None:
         return 'unhadled'
 
+    return handler(event)
+
 ########################## PROTOCOL COMMUNICATION ###########################
 
 
@@ -127,7 +118,7 @@ def validate_message(event, node):
     node_state, cp_state = node.state, node.state.cp_state
     payload = event.payload
 
-    if payload['round'] < cp_state.round.round:
+    if payload.round < cp_state.round.round:
         return False
 
     return True
@@ -138,11 +129,41 @@ def process_vote(node, type, sender):
     node.state.cp_state.msgs[type] += [sender.id]
 
 
+def process_votes(node, type, event):
+    # an aggregated vote (see VoteAggregation) carries the votes of several nodes
+    for sender in VoteAggregation.voters(event):
+        process_vote(node, type, sender)
+
+
+def broadcast_vote(node, time, payload):
+    # prepare/commit votes are aggregated into quorum events if enabled (see VoteAggregation)
+    if VoteAggregation.active(Parameters.PBFT):
+        VoteAggregation.broadcast(node, time, payload, handle_event, vote_thresholds)
+    else:
+        node.scheduler.schedule_broadcast_message(
+            node, time, payload, handle_event)
+
+
+def vote_thresholds(receiver, payload):
+    '''
+        votes from other nodes receiver needs to move on in a vote phase (used when aggregating votes)
+            prepare: required_messages - 1 (the proposer does not vote - the other nodes count their own vote)
+            commit: required_messages - 1 (every node counts its own vote)
+    '''
+    required = Parameters.application["required_messages"]
+    own = receiver.id != payload.block.miner
+
+    if payload.TYPE == Messages.PREPARE:
+        return (required - 1 - own,)
+
+    return (required - 1,)
+
+
 def pre_prepare(event):
     node = event.receiver
     time = event.time
     state = node.state.cp_state
-    block = event.payload['block']
+    block = event.payload.block
     
     time += Parameters.execution["msg_val_delay"]
 
@@ -153,7 +174,7 @@ def pre_prepare(event):
             time += Parameters.execution["block_val_delay"]
 
             # store block as current block
-            state.block = event.payload['block'].copy()
+            state.block = event.payload.block
             block = state.block
 
             # change state to pre_prepared since block was accepted
@@ -161,13 +182,8 @@ def pre_prepare(event):
             state.block = block
 
             # broadcast preare message
-            payload = {
-                'type': 'prepare',
-                'block': block,
-                'round': state.round.round,
-            }
-            node.scheduler.schedule_broadcast_message(
-                node, time, payload, handle_event)
+            payload = Messages.Prepare(block, state.round.round)
+            broadcast_vote(node, time, payload)
 
             # count own vote
             process_vote(node, 'prepare', node)
@@ -185,7 +201,7 @@ def prepare(event):
     node = event.receiver
     time = event.time
     state = node.state.cp_state
-    block = event.payload['block']
+    block = event.payload.block
 
     if not validate_message(event, node):
         return "invalid"
@@ -194,7 +210,7 @@ def prepare(event):
 
     if state.state == 'pre_prepared':
         # count prepare votes from other nodes
-        process_vote(node, 'prepare', event.creator)
+        process_votes(node, 'prepare', event)
 
         # if we have enough prepare messages (2f messages since leader does not participate || has allread 'voted')
         if len(state.msgs['prepare']) == Parameters.application["required_messages"] - 1:
@@ -202,13 +218,8 @@ def prepare(event):
             state.state = 'prepared'
 
             # send commit message
-            payload = {
-                'type': 'commit',
-                'block': block,
-                'round': state.round.round,
-            }
-            node.scheduler.schedule_broadcast_message(
-                node, time, payload, handle_event)
+            payload = Messages.Commit(block, state.round.round)
+            broadcast_vote(node, time, payload)
 
             # count own vote
             process_vote(node, 'commit', node)
@@ -224,7 +235,7 @@ def prepare(event):
         # enough it will depending on the reason do the following:
         # 1) (node timed out) will accept block and keep working as normal
         # 2) (node though block was invalid) try to sync using block_data else initialise sync
-        process_vote(node, 'prepare', event.creator)
+        process_votes(node, 'prepare', event)
 
         # if we have enough prepare messages (2f - 2 messages since we trust our self so that makes it 2f (leader does not participate))
         # in the case where the node has entered rounch switch we do not count our own vote then 2f - 2 for prepare
@@ -232,10 +243,10 @@ def prepare(event):
             time += Parameters.execution["block_val_delay"]
 
             if block.depth - 1 == node.last_block.depth:
-                state.round.round = event.payload['round']
+                state.round.round = event.payload.round
 
                 # store block as current block
-                state.block = event.payload['block'].copy()
+                state.block = event.payload.block
                 block = state.block
 
                 # change state to pre_prepared since block was accepted
@@ -243,13 +254,8 @@ def prepare(event):
                 state.block = block
 
                 # broadcast preare message
-                payload = {
-                    'type': 'prepare',
-                    'block': block,
-                    'round': state.round.round,
-                }
-                node.scheduler.schedule_broadcast_message(
-                    node, time, payload, handle_event)
+                payload = Messages.Prepare(block, state.round.round)
+                broadcast_vote(node, time, payload)
 
                 # count own vote
                 process_vote(node, 'prepare', node)
@@ -271,7 +277,7 @@ def commit(event):
     node = event.receiver
     time = event.time
     state = node.state.cp_state
-    block = event.payload['block'].copy()
+    block = event.payload.block
 
     if not validate_message(event, node):
         return "invalid"
@@ -279,26 +285,17 @@ def commit(event):
 
     # if prepared
     if state.state == 'prepared':
-        process_vote(node, 'commit', event.creator)
+        process_votes(node, 'commit', event)
 
         if len(state.msgs['commit']) >= Parameters.application["required_messages"]:
-            payload = {
-                'type': 'commit',
-                'block': block,
-                'round': state.round.round,
-            }
-            node.scheduler.schedule_broadcast_message(
-                node, time, payload, handle_event)
+            payload = Messages.Commit(block, state.round.round)
+            broadcast_vote(node, time, payload)
 
             process_vote(node, 'commit', node)
 
             node.add_block(state.block, time)
             
-            payload = {
-                'type': 'new_block',
-                'block': block,
-                'round': state.round.round,
-            }
+            payload = Messages.NewBlock(block, state.round.round)
 
             node.scheduler.schedule_broadcast_message(
                 node, time, payload, handle_event)
@@ -316,34 +313,25 @@ def commit(event):
         # Node will count the messages and if it receieves enough it will depending on the reason do the following:
         # 1) (node timed out) will accept block and keep working as normal
         # 2) (node though block was invalid) try to sync using block_data else initialise sync
-        process_vote(node, 'commit', event.creator)
+        process_votes(node, 'commit', event)
 
         # if we have enough commit messages (2f messages since we trust our self so that makes it 2f+1)
         if len(state.msgs['commit']) >= Parameters.application["required_messages"] - 1:
             time += Parameters.execution["block_val_delay"]
 
             if block.depth - 1 == node.last_block.depth:
-                state.round.round = event.payload['round']
+                state.round.round = event.payload.round
 
                 # send commit message (since now node agrees that this block should be commited)
-                payload = {
-                    'type': 'commit',
-                    'block': block,
-                    'round': state.round.round,
-                }
-                node.scheduler.schedule_broadcast_message(
-                    node, time, payload, handle_event)
+                payload = Messages.Commit(block, state.round.round)
+                broadcast_vote(node, time, payload)
 
                 process_vote(node, 'commit', node)
 
                 # send new block message since we have received enough commit messages
                 node.add_block(block, time)
 
-                payload = {
-                    'type': 'new_block',
-                    'block': block,
-                    'round': state.round.round,
-                }
+                payload = Messages.NewBlock(block, state.round.round)
                 node.scheduler.schedule_broadcast_message(
                     node, time, payload, handle_event)
 
@@ -363,7 +351,7 @@ def commit(event):
 
 def new_block(event):
     node = event.receiver
-    block = event.payload['block']
+    block = event.payload.block
     time = event.time
 
     if not validate_message(event, node):
@@ -385,12 +373,12 @@ def new_block(event):
             return "handled"
     else:  # Valid block
         # correct round
-        if event.payload['round'] > node.state.cp_state.round.round:
+        if event.payload.round > node.state.cp_state.round.round:
             # BUG: minor bug: fix and test
             node.state.cp_state.round.round
         # add block and start new round
         node.add_block(block, time)
-        start(node, event.payload['round']+1, time)
+        start(node, event.payload.round+1, time)
         return "handled"
 
 ########################## ROUND CHANGE ###########################
@@ -406,9 +394,10 @@ def start(node, new_round, time):
     state = node.state.cp_state
 
     state.state = 'new_round'
-    node.backlog = []
+    node.backlog.clear()
 
     reset_msgs(node)
+    VoteAggregation.prune(node, new_round)
 
     state.round.round = new_round
     state.block = None
@@ -426,13 +415,9 @@ def start(node, new_round, time):
             return 0
 
         state.state = 'pre_prepared'
-        state.block = block.copy()
+        state.block = block
         
-        payload = {
-            'type': 'pre_prepare',
-            'block': block,
-            'round': new_round,
-        }   
+        payload = Messages.PrePrepare(block, new_round)   
 
         node.scheduler.schedule_broadcast_message(
             node, creation_time, payload, handle_event)
@@ -446,7 +431,7 @@ def start(node, new_round, time):
 def timeout(event):
     node = event.creator
 
-    if event.payload['round'] == node.state.cp_state.round.round:
+    if event.payload.round == node.state.cp_state.round.round:
         if event.actor.update(event.time):
             return 0
 
@@ -465,18 +450,12 @@ def timeout(event):
 
 def schedule_timeout(node, time, remove=True, add_time=True):
     if node.state.cp_state.timeout is not None and remove:
-        try:
-            node.remove_event(node.state.cp_state.timeout)
-        except ValueError:
-            pass
+        node.state.cp_state.timeout.cancel()
 
     if add_time:
         time += Parameters.PBFT['timeout']
 
-    payload = {
-        'type': 'timeout',
-        'round': node.state.cp_state.round.round,
-    }
+    payload = Messages.Timeout(node.state.cp_state.round.round)
 
     event = node.scheduler.schedule_event(node, time, payload, handle_event)
     node.state.cp_state.timeout = event
@@ -489,14 +468,30 @@ def resync(node, payload, time):
         PBFT specific resync actions
     '''
     set_state(node)
-    if node.state.cp_state.round.round < payload['blocks'][-1].extra_data['round']:
-        node.state.cp_state.round.round = payload['blocks'][-1].extra_data['round']
+    if node.state.cp_state.round.round < payload.blocks[-1].extra_data['round']:
+        node.state.cp_state.round.round = payload.blocks[-1].extra_data['round']
 
     schedule_timeout(node, time=time)
 
 ######################### OTHER #################################################
 
 def clean_up(node):
-    for event in node.queue.event_list:
-        if event.payload["CP"] == NAME:
-            node.queue.remove_event(event)
+    node.queue.cancel_where(lambda event: event.payload.CP == NAME)
+
+########################## DISPATCH TABLE ###########################
+
+# opcode -> handler (defined last since it references the handlers above)
+HANDLERS = Messages.dispatch_table({
+    Messages.PRE_PREPARE: pre_prepare,
+    Messages.PREPARE: prepare,
+    Messages.COMMIT: commit,
+    Messages.TIMEOUT: timeout,
+    Messages.NEW_BLOCK: new_block,
+})
+
+# opcodes of the backlogged events that may be handled once a node enters a state (see Handler.handle_backlog)
+BACKLOG_READY = {
+    'pre_prepared': (Messages.PREPARE,),
+    'prepared': (Messages.COMMIT,),
+    'round_change': (Messages.PREPARE, Messages.COMMIT),
+}
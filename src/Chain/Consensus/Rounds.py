@@ -4,6 +4,8 @@
 from types import SimpleNamespace
 from Chain.Parameters import Parameters
 
+import Chain.Messages as Messages
+
 def round_change_state(round=0):
     '''
         Rounc chage state
@@ -32,8 +34,10 @@ def handle_event(event):
     '''
         handles round change events
     '''
-    if event.payload['type'] == "round_change":
-        handle_round_change_msg(event)
+    handler = HANDLERS[event.payload.TYPE]
+
+    if handler is not None:
+        return handler(event)
 
 def change_round(node, time):
     '''
@@ -48,10 +52,7 @@ def change_round(node, time):
 
     state.round.change_to = new_round
 
-    payload = {
-        'type': 'round_change',
-        'new_round': new_round
-    }
+    payload = Messages.RoundChange(new_round)
 
     node.scheduler.schedule_broadcast_message(
         node, time, payload, handle_event)
@@ -59,7 +60,7 @@ def change_round(node, time):
 def handle_round_change_msg(event):
     node = event.receiver
     time = event.time
-    new_round = event.payload['new_round']
+    new_round = event.payload.new_round
     state = node.state.cp_state
 
     msgs = state.round.votes
@@ -116,3 +117,8 @@ def count_round_change_vote(node, new_round, voter):
         msgs[new_round] = [voter]
 
     return "handled"
+
+# opcode -> handler (defined last since it references the handlers above)
+HANDLERS = Messages.dispatch_table({
+    Messages.ROUND_CHANGE: handle_round_change_msg,
+})
@@ -0,0 +1,132 @@
+'''
+    Aggregated votes - fast path for the prepare/commit phases of PBFT and BigFoot
+
+    In the vote phases every node broadcasts its vote and every node handles N-1 vote messages, even though
+    the outcome only depends on when a threshold of votes (the quorum) has arrived.
+
+    In aggregated mode a vote is not delivered as N-1 messages. Instead its arrival time at each receiver
+    (Network.calculate_message_propagation_delay) is added to the receiver's quorum for (round, vote type).
+    The quorum keeps the arrivals in time order and schedules one event per threshold at the k-th arrival
+    (the k-th order statistic). The event carries the votes of the senders that arrived since the previous
+    threshold (payload.voters). When a vote arrives earlier than a scheduled threshold event, the event is
+    rescheduled (so its time is always the k-th earliest arrival known so far).
+
+    Thresholds (number of votes from other nodes) are given per receiver by the CP (see PBFT/BigFoot.vote_thresholds)
+
+    Aggregation is only active if enabled in the config of the CP (aggregate_votes) and the run is honest:
+    no faulty/byzantine nodes and no gossip - otherwise votes are simulated message by message.
+    It is exact for the normal path - a node in round change counts the batch of votes as it arrives
+    (its lower threshold is reached at the time of the batch rather than at the time of the exact vote).
+'''
+from Chain.Event import Event, MessageEvent
+from Chain.Network import Network
+from Chain.Parameters import Parameters
+
+import Chain.Messages as Messages
+
+from bisect import bisect
+from itertools import count
+
+# payload record carrying a batch of votes for each vote type
+QUORUM_PAYLOADS = {
+    Messages.PREPARE: Messages.PrepareQuorum,
+    Messages.COMMIT: Messages.CommitQuorum,
+}
+
+
+def active(cp_params):
+    '''
+        True if votes should be aggregated for the CP with the given parameters
+    '''
+    return cp_params.get("aggregate_votes", False) \
+        and not Parameters.network["gossip"] \
+        and Parameters.behaiviour["crash_probs"]["faulty_nodes"] == 0 \
+        and Parameters.behaiviour["byzantine_nodes"]["num_byzantine"] == 0
+
+
+def voters(event):
+    '''
+        nodes whose votes are carried by event (the creator for a plain vote message)
+    '''
+    return getattr(event.payload, "voters", (event.creator,))
+
+
+class Quorum:
+    '''
+        Votes of one type for one round as seen by a receiver
+
+        arrivals - (time, seq, sender) of every vote in ascending time order
+        handles - handle of the scheduled event of each threshold (None until enough votes are known)
+    '''
+    _seq = count()
+
+    def __init__(self, receiver, thresholds, payload, handler):
+        self.receiver = receiver
+        self.thresholds = thresholds
+        self.payload = payload
+        self.handler = handler
+
+        self.arrivals = []
+        self.handles = [None] * len(thresholds)
+
+    def add(self, time, sender):
+        arrival = (time, next(Quorum._seq), sender)
+        position = bisect(self.arrivals, arrival)
+        self.arrivals.insert(position, arrival)
+
+        prev = 0
+        for i, k in enumerate(self.thresholds):
+            # thresholds at or before the new arrival keep their votes (they have allready fired if their time has passed)
+            if k > position and len(self.arrivals) >= k:
+                self.schedule(i, prev, k)
+            prev = k
+
+    def schedule(self, i, start, k):
+        '''
+            (re)schedules the event of threshold i - delivering the votes of arrivals[start:k] at the k-th arrival
+        '''
+        if self.handles[i] is not None:
+            self.handles[i].cancel()
+
+        time, _, sender = self.arrivals[k - 1]
+
+        payload = QUORUM_PAYLOADS[self.payload.TYPE](
+            self.payload.block, self.payload.round, [a[2] for a in self.arrivals[start:k]])
+        payload.CP = self.payload.CP
+
+        event = MessageEvent(self.handler, sender, time, payload, -1, self.receiver)
+        self.handles[i] = self.receiver.add_event(event)
+
+
+def broadcast(node, time, payload, handler, thresholds):
+    '''
+        broadcasts a vote in aggregated mode - adds its arrival to the quorum of every other online node
+            thresholds(receiver, payload) - votes (from other nodes) the receiver needs at each threshold
+    '''
+    payload.CP = node.state.cp.NAME
+    size = Network.size(Event(handler, node, time, payload))
+
+    receivers = [n for n in Network.nodes if n != node and n.state.alive]
+    if not receivers:
+        return
+
+    times = (time + Network.delays(node, receivers, size)).tolist()
+    key = (payload.round, payload.TYPE)
+
+    for receiver, arrival in zip(receivers, times):
+        quorums = receiver.state.cp_state.quorums
+
+        if key not in quorums:
+            quorums[key] = Quorum(
+                receiver, sorted({k for k in thresholds(receiver, payload) if k > 0}), payload, handler)
+
+        quorums[key].add(arrival, node)
+
+
+def prune(node, new_round):
+    '''
+        drops the quorums of the rounds before new_round (called when node starts a new round)
+    '''
+    quorums = node.state.cp_state.quorums
+    for key in [key for key in quorums if key[0] < new_round]:
+        del quorums[key]
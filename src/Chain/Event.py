@@ -1,4 +1,4 @@
-from random import randint
+from itertools import count
 
 class Event():
     '''
@@ -11,7 +11,15 @@ class Event():
         Event: Models a local event (i.e timeouts) - is added straight into the EventQueue of the node
 
         actor: reference to the node that this event is meant for - any object inheriting base event *MUST* use the "actor" attribute
+
+        id: unique (monotonically assigned) id - messages created from an event keep the id of the event
+            (assigning ids does not draw from the seeded random module)
+
+        payload: a typed payload record (see Messages)
     '''
+    __slots__ = ('id', 'handler', 'creator', 'time', 'payload', 'actor')
+    _ids = count()
+
     def __lt__(self, other):
         return self.time < other.time
 
@@ -34,11 +42,11 @@ class Event():
         return f"LCL: {self.creator.id} at {round(self.time,3)} - payload {self.payload}"
 
     def __repr__(self):
-        return f"LCL: {self.creator.id} {round(self.time,3)} {self.payload['type']}"
+        return f"LCL: {self.creator.id} {round(self.time,3)} {self.payload.name}"
 
     def __init__(self, handler, creator, time, payload, id = -1) -> None:
-        # unique id (or hash) used to identeify received messages for gossip
-        self.id = randint(0, 1000000) if id == -1 else id
+        # unique id used to identeify received messages for gossip
+        self.id = next(Event._ids) if id == -1 else id
         
         self.handler = handler
         self.creator = creator
@@ -51,7 +59,7 @@ class Event():
         return {
             "creator": self.creator.id,
             "time": self.time,
-            "type": self.payload["type"]
+            "type": self.payload.name
         }
 
 class MessageEvent(Event):
@@ -59,6 +67,7 @@ class MessageEvent(Event):
         Models messages betwee nodes (i.e cp message, sync msessage, new blocks etc)
         is created by the netwrok through a node Event and added to the EQ's of other nodes
     '''
+    __slots__ = ('receiver',)
 
     def __str__(self):
         return f"MSG: {self.creator} -> {self.receiver}  {round(self.time,3)} - payload {self.payload}"
@@ -85,13 +94,15 @@ class MessageEvent(Event):
             "creator": self.creator.id,
             "receiver": self.receiver.id,
             "time": self.time,
-            "type": self.payload["type"]
+            "type": self.payload.name
         }
 
 class SystemEvent():
     '''
         Simplified event for simulation managemnt tasks
     '''
+    __slots__ = ('time', 'payload')
+
     def __lt__(self, other):
         return self.time < other.time
 
@@ -0,0 +1,286 @@
+'''
+    Global event calendar - holds every pending event of the simulation (node, sync and system events)
+
+    Events are stored as EventHandle objects ([time, seq, queue, event]) where:
+        time - time the event is scheduled for
+        seq - global sequence number (used to break ties in time in FIFO order)
+        queue - the Queue (EventQueue) the event belongs to (used to find who handles the event)
+                None once the event has been cancelled
+        event - the event itself
+
+    Cancelling is lazy: the handle is marked (tombstone) in O(1) and dropped when it reaches the front of the
+    calendar. Once tombstones make up most of the calendar it is compacted.
+
+    Backends:
+        heap - binary heap (O(log n) push/pop)
+        calendar - calendar queue (O(1) average push/pop)
+'''
+import heapq
+import itertools
+
+from bisect import insort
+
+
+class EventHandle(list):
+    '''
+        A scheduled event: [time, seq, queue, event] - returned when an event is scheduled and used to cancel it
+
+        Handles compare as lists - since seq is unique, ties in time are broken by
+        insertion order and the queue/event are never compared
+    '''
+    __slots__ = ()
+
+    @staticmethod
+    def detached(event):
+        '''
+            handle of an event that was never scheduled (e.g the node was offline)
+        '''
+        return EventHandle((event.time, -1, None, event))
+
+    def __str__(self):
+        return str(self[3])
+
+    def __repr__(self):
+        return repr(self[3])
+
+    @property
+    def time(self):
+        return self[0]
+
+    @property
+    def seq(self):
+        return self[1]
+
+    @property
+    def queue(self):
+        return self[2]
+
+    @property
+    def event(self):
+        return self[3]
+
+    @property
+    def cancelled(self):
+        return self[2] is None
+
+    def cancel(self):
+        '''
+            cancels the event (does nothing if the event was allready cancelled)
+        '''
+        if self[2] is not None:
+            self[2].cancel(self)
+
+
+class HeapCalendar:
+    '''
+        Event calendar backed by a binary heap
+    '''
+    _COMPACT_MIN = 64
+
+    def __init__(self):
+        self.heap = []
+        self.seq = itertools.count()
+        self.cancelled = 0
+
+    def __len__(self):
+        return len(self.heap) - self.cancelled
+
+    def push(self, time, queue, event):
+        '''
+            schedules event at time - returns the handle of the event
+        '''
+        entry = EventHandle((time, next(self.seq), queue, event))
+        heapq.heappush(self.heap, entry)
+        return entry
+
+    def reinsert(self, entry):
+        '''
+            adds a previously popped entry back into the calendar (keeps its original time and seq)
+        '''
+        heapq.heappush(self.heap, entry)
+
+    def _drop_cancelled(self):
+        heap = self.heap
+        while heap and heap[0][2] is None:
+            heapq.heappop(heap)
+            self.cancelled -= 1
+
+    def peek(self):
+        self._drop_cancelled()
+        return self.heap[0] if self.heap else None
+
+    def pop(self):
+        self._drop_cancelled()
+        return heapq.heappop(self.heap) if self.heap else None
+
+    def cancel(self, entry):
+        '''
+            marks entry as cancelled - once most of the heap is cancelled entries the heap is rebuilt without them
+        '''
+        entry[2] = None
+        self.cancelled += 1
+
+        if self.cancelled > HeapCalendar._COMPACT_MIN and 2 * self.cancelled > len(self.heap):
+            self.heap = [e for e in self.heap if e[2] is not None]
+            heapq.heapify(self.heap)
+            self.cancelled = 0
+
+
+class CalendarQueue:
+    '''
+        Event calendar backed by a calendar queue
+            R. Brown, "Calendar queues: a fast O(1) priority queue implementation for the
+            simulation event set problem", Communications of the ACM, 1988
+
+        Time is divided into 'days' of equal width and each day is hashed into a bucket (day % buckets).
+        Dequeuing walks the calendar one day at a time starting from the day of the last dequeued event.
+        The number of buckets follows the number of events and the day width is re-estimated from the
+        spacing of the earliest events whenever the calendar is resized.
+    '''
+    _MIN_BUCKETS = 2
+    _WIDTH_SAMPLE = 25
+
+    def __init__(self, buckets=_MIN_BUCKETS, width=1.0):
+        self.seq = itertools.count()
+        self._build(buckets, width, 0.0, [])
+
+    def __len__(self):
+        return self.size - self.cancelled
+
+    def _build(self, buckets, width, start, entries):
+        self.buckets = [[] for _ in range(buckets)]
+        self.width = width
+
+        # absolute day (time // width) from which the next search starts
+        self.day = int(start / width)
+
+        # size includes cancelled entries that are yet to be dropped
+        self.size = len(entries)
+        self.cancelled = 0
+
+        self.grow_at = 2 * buckets
+        self.shrink_at = buckets // 2 - 2
+
+        for entry in entries:
+            insort(self.buckets[int(entry[0] / width) % buckets], entry)
+
+    def _resize(self, buckets):
+        # resizing also compacts the calendar (cancelled entries are not carried over)
+        entries = [e for b in self.buckets for e in b if e[2] is not None]
+
+        self._build(buckets, self._estimate_width(entries), self.day * self.width, entries)
+
+    def _estimate_width(self, entries):
+        '''
+            width = 3 * average separation of the earliest events (ignoring large gaps)
+        '''
+        sample = [e[0] for e in heapq.nsmallest(CalendarQueue._WIDTH_SAMPLE, entries)]
+        gaps = [b - a for a, b in zip(sample[:-1], sample[1:]) if b > a]
+
+        if not gaps:
+            return self.width
+
+        avg = sum(gaps) / len(gaps)
+        gaps = [g for g in gaps if g <= 2 * avg]
+
+        return 3 * sum(gaps) / len(gaps)
+
+    def push(self, time, queue, event):
+        '''
+            schedules event at time - returns the handle of the event
+        '''
+        entry = EventHandle((time, next(self.seq), queue, event))
+        self.reinsert(entry)
+        return entry
+
+    def reinsert(self, entry):
+        '''
+            adds a previously popped entry back into the calendar (keeps its original time and seq)
+        '''
+        day = int(entry[0] / self.width)
+        insort(self.buckets[day % len(self.buckets)], entry)
+
+        # event scheduled before the current day - search must start from it
+        if day < self.day:
+            self.day = day
+
+        self.size += 1
+        if len(self) > self.grow_at:
+            self._resize(2 * len(self.buckets))
+
+    def _find(self):
+        '''
+            returns the bucket containing the next entry (and moves the current day to it)
+        '''
+        n = len(self.buckets)
+        day = self.day
+
+        for _ in range(n):
+            bucket = self.buckets[day % n]
+            if bucket and bucket[0][0] < (day + 1) * self.width:
+                self.day = day
+                return bucket
+            day += 1
+
+        # no event in the next 'year' - jump straight to the earliest event
+        bucket = min((b for b in self.buckets if b), key=lambda b: b[0])
+        self.day = int(bucket[0][0] / self.width)
+        return bucket
+
+    def _front(self):
+        '''
+            returns the bucket holding the next (not cancelled) event - dropping cancelled entries on the way
+        '''
+        while self.size:
+            bucket = self._find()
+            if bucket[0][2] is not None:
+                return bucket
+
+            bucket.pop(0)
+            self.size -= 1
+            self.cancelled -= 1
+
+        return None
+
+    def peek(self):
+        bucket = self._front()
+        return bucket[0] if bucket is not None else None
+
+    def pop(self):
+        bucket = self._front()
+        if bucket is None:
+            return None
+
+        entry = bucket.pop(0)
+
+        self.size -= 1
+        if len(self) < self.shrink_at and len(self.buckets) > CalendarQueue._MIN_BUCKETS:
+            self._resize(len(self.buckets) // 2)
+
+        return entry
+
+    def cancel(self, entry):
+        '''
+            marks entry as cancelled - cancelled entries are dropped when reached or when the calendar is resized
+        '''
+        entry[2] = None
+        self.cancelled += 1
+
+        if self.cancelled > HeapCalendar._COMPACT_MIN and 2 * self.cancelled > self.size:
+            self._resize(len(self.buckets))
+
+
+BACKENDS = {
+    "heap": HeapCalendar,
+    "calendar": CalendarQueue,
+}
+
+
+def create(backend="heap"):
+    '''
+        returns a new event calendar using the given backend (see BACKENDS)
+    '''
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown event calendar backend '{backend}' - available: {list(BACKENDS)}")
+
+    return BACKENDS[backend]()
@@ -1,73 +1,300 @@
-import bisect
 from Chain.Event import MessageEvent
+from Chain.EventCalendar import EventHandle
+from Chain.Parameters import Parameters
+
+from collections import OrderedDict, deque
+from itertools import count
+from sys import getsizeof
+
+
+class SeenMessages:
+    '''
+        Bounded set of the ids of messages a node has received (used to deduplicate gossip)
+        Once full, the least recently seen ids are forgotten first (LRU)
+    '''
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.ids = OrderedDict()
+
+    def __contains__(self, id):
+        return id in self.ids
+
+    def __len__(self):
+        return len(self.ids)
+
+    def add(self, id):
+        if id in self.ids:
+            self.ids.move_to_end(id)
+            return
+
+        self.ids[id] = None
+        if len(self.ids) > self.capacity:
+            self.ids.popitem(last=False)
+
+
+class EventHistory:
+    '''
+        Ring buffer of processed events - keeps memory constant in long runs
+
+        Retention policies (simulation.event_history):
+            none - processed events are not kept
+            last_k - keep the last k processed events
+            window - keep the events processed in the last 'window' seconds of simulated time
+    '''
+    def __init__(self, policy="last_k", k=100, window=None):
+        if policy not in ("none", "last_k", "window"):
+            raise ValueError(f"Unknown event history policy '{policy}' - available: none, last_k, window")
+
+        self.policy = policy
+        self.window = window
+        self.events = deque(maxlen=k if policy == "last_k" else None)
+
+    def __len__(self):
+        return len(self.events)
+
+    def __iter__(self):
+        return iter(self.events)
+
+    def append(self, event):
+        if self.policy == "none":
+            return
+
+        self.events.append(event)
+
+        if self.policy == "window":
+            while self.events[0].time < event.time - self.window:
+                self.events.popleft()
+
+    def memory_usage(self):
+        '''
+            approximate memory (in bytes) held by the history (the buffer and the event objects - not their payloads)
+        '''
+        return getsizeof(self.events) + sum(getsizeof(e) for e in self.events)
+
+    @staticmethod
+    def from_config():
+        params = Parameters.simulation["event_history"]
+        return EventHistory(params["policy"], params["k"], params["window"])
+
+
+class Backlog:
+    '''
+        Future events a node could not handle in its current state (see Handler)
+
+        Events are indexed by (round, type) so that when the node changes state only the events that may now
+        succeed are re-examined (see the BACKLOG_READY table of the CPs) and handled events are removed in O(1)
+
+        index - (round, opcode) -> {seq: event} (seq: insertion order - breaks ties in time)
+    '''
+    def __init__(self):
+        self.index = {}
+        self.seq = count()
+
+        # incremented when the backlog is cleared (the node moved on to a new round)
+        self.generation = 0
+
+    def __len__(self):
+        return sum(len(bucket) for bucket in self.index.values())
+
+    def __iter__(self):
+        '''
+            backlogged events in time order
+        '''
+        return iter(sorted((e for b in self.index.values() for e in b.values()), key=lambda e: e.time))
+
+    def add(self, event):
+        key = (getattr(event.payload, 'round', None), event.payload.TYPE)
+
+        if key in self.index:
+            self.index[key][next(self.seq)] = event
+        else:
+            self.index[key] = {next(self.seq): event}
+
+    def ready(self, types):
+        '''
+            backlogged events of the given types as (key, seq, event) in time order
+        '''
+        entries = [(event.time, seq, key, event)
+                   for key, bucket in self.index.items() if key[1] in types
+                   for seq, event in bucket.items()]
+        entries.sort(key=lambda e: e[:2])
+
+        return [(key, seq, event) for _, seq, key, event in entries]
+
+    def remove(self, key, seq):
+        bucket = self.index[key]
+        del bucket[seq]
+
+        if not bucket:
+            del self.index[key]
+
+    def clear(self):
+        self.index.clear()
+        self.generation += 1
+
 
 class Queue:
     '''
         Event queue implementation - holds future events scheduled to be executed
 
-        event_list - holds future node events (in ascending time order)
+        Events are ordered by the global event calendar (EventCalendar) shared by all queues.
+        The queue keeps track of which calendar entries are its own so that they can be inspected/removed
+
+        calendar - the global event calendar
+        owner - the node this queue belongs to (None for the system queue)
+        entries - handles of the pending events of this queue (id(event) -> handle)
+        parked - handles held back while the owner is offline (seq -> handle) (rescheduled when it comes back online)
+        seen - ids of the messages added to the queue (only kept in gossip mode)
+        history - recently processed events (retention set by simulation.event_history)
+
+        add_event returns an EventHandle - events are removed by cancelling their handle
     '''
-    _MESSAGE_HISTORY_CAP = 100
+    fanout = False
 
-    def __init__(self):
-        self.event_list = []
-        self.old_messages = []
+    def __init__(self, calendar, owner=None):
+        self.calendar = calendar
+        self.owner = owner
+
+        self.entries = {}
+        self.parked = {}
+
+        self.seen = SeenMessages(Parameters.network["seen_messages_cap"]) if Parameters.network["gossip"] else None
+
+        self.history = EventHistory.from_config()
 
     @property
-    def time_next(self):
-        return self.event_list[0].time if self.event_list else None
+    def event_list(self):
+        '''
+            pending events in ascending time order (builds a new list - use for inspection only)
+        '''
+        return [entry.event for entry in sorted(self.entries.values())]
 
-    def add_old_to_old_messages(self, item):
-        if len(self.old_messages) > Queue._MESSAGE_HISTORY_CAP:
-            self.old_messages.pop(0)
-            self.old_messages.append(item)
+    @property
+    def time_next(self):
+        event = self.get_next_event()
+        return event.time if event is not None else None
 
     def add_event(self, event):
         '''
-            inserts events while mainiting time order
+            schedules event in the global calendar - returns the handle of the event
         '''
-        bisect.insort(self.event_list, event)
+        entry = self.calendar.push(event.time, self, event)
+        self.entries[id(event)] = entry
 
-    def remove_event(self, event, search=False):
+        if self.seen is not None and isinstance(event, MessageEvent):
+            self.seen.add(event.id)
+
+        return entry
+
+    def adopt(self, event):
         '''
-            removes given event - if serach is true, first search for event to make sure it exists
-            search is set as false to reduce comp. complexity when events are knows to be in the queue
+            registers an event that was delivered straight from the calendar (see Fanout) - returns its handle
+            (the handle is not in the calendar - it is retired or parked right away)
         '''
-        if search:
-            if event in self.event_list:
-                self.event_list.remove(event)
-                self.add_old_to_old_messages(event)
-        else:
-            self.event_list.remove(event)
-            self.add_old_to_old_messages(event)
-        
+        entry = EventHandle((event.time, next(self.calendar.seq), self, event))
+        self.entries[id(event)] = entry
 
-    def get_next_event(self):
+        if self.seen is not None:
+            self.seen.add(event.id)
+
+        return entry
+
+    def cancel(self, entry):
         '''
-            returns next event to be executed event 
+            cancels a pending event (called through EventHandle.cancel) - O(1)
         '''
-        return self.event_list[0] if self.event_list else None
+        del self.entries[id(entry.event)]
 
+        if self.parked.pop(entry.seq, None) is None:
+            self.calendar.cancel(entry)
+        else:
+            entry[2] = None
 
-    def pop_next_event(self):
+    def cancel_where(self, condition):
+        '''
+            cancels every pending event for which condition(event) is True
         '''
-            REMOVES and returns next event to be executed event 
+        for entry in list(self.entries.values()):
+            if condition(entry.event):
+                entry.cancel()
+
+    def retire(self, entry):
         '''
-        event = self.event_list.pop(0)
-        self.old_messages.append(event)
+            called once entry has been popped from the calendar to be executed - returns its event
+        (the handle is detached from the queue so cancelling an executed event does nothing)
+        '''
+        event = entry.event
+        del self.entries[id(event)]
+        entry[2] = None
+        self.history.append(event)
         return event
 
+    def park(self, entry):
+        '''
+            holds back a popped entry (the owner is offline)
+        '''
+        self.parked[entry.seq] = entry
+
+    def unpark(self):
+        '''
+            puts held back entries back into the calendar (with their original times)
+        '''
+        for entry in self.parked.values():
+            self.calendar.reinsert(entry)
+        self.parked = {}
+
+    def get_next_event(self):
+        '''
+            returns next event to be executed (scans the queue - use for inspection only)
+        '''
+        return min(self.entries.values()).event if self.entries else None
+
     def size(self):
-        return len(self.event_list)
+        return len(self.entries)
 
     def isEmpty(self):
-        return self.event_list
+        return not self.entries
 
     def contains_event_message(self, event):
         '''
-            Check if node has received message
+            Check if node has received message (O(1) - bounded by network.seen_messages_cap)
         '''
-        def compare(x): return isinstance(x, MessageEvent) and x.id == event.id
-        
-        # True if message is in event list or old messages
-        return any(map(compare, self.event_list)) or any(map(compare, self.old_messages))
+        return self.seen is not None and event.id in self.seen
+
+
+class Fanout:
+    '''
+        Lazy broadcast - holds every delivery of a broadcast message as a single calendar entry
+
+        arrivals - (time, receiver) pairs in ascending time order
+        next - index of the next delivery
+
+        When the entry is popped (see Simulation.get_next_event) the next delivery is turned into a
+        MessageEvent for its receiver (sharing the payload of the broadcast event) and the entry is
+        pushed back for the following arrival. Deliveries in flight are not in the receivers' queues.
+    '''
+    __slots__ = ('calendar', 'event', 'arrivals', 'next')
+    fanout = True
+
+    def __init__(self, calendar, event, arrivals):
+        self.calendar = calendar
+        self.event = event
+        self.arrivals = arrivals
+        self.next = 0
+
+        calendar.push(arrivals[0][0], self, event)
+
+    def deliver(self):
+        '''
+            returns the handle of the next delivery (adopted by the queue of its receiver)
+        '''
+        time, receiver = self.arrivals[self.next]
+        self.next += 1
+
+        if self.next < len(self.arrivals):
+            self.calendar.push(self.arrivals[self.next][0], self, self.event)
+
+        msg = MessageEvent.from_Event(self.event, receiver)
+        msg.time = time
+
+        return receiver.queue.adopt(msg)
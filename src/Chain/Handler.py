@@ -1,5 +1,3 @@
-import bisect
-
 from Chain.Parameters import Parameters
 from Chain.Network import Network
 
@@ -13,7 +11,7 @@ from Chain.Metrics import SimulationState
     Handling and running Events
 '''
 
-def handle_event(event, backlog=True):
+def handle_event(event):
     '''
         Handless events by calling their respctive handlers and backlogs
 
@@ -27,56 +25,75 @@ def handle_event(event, backlog=True):
 
     SimulationState.store_event(event)
 
-    if event.payload["type"] in Parameters.simulation["events"].keys():
-        Parameters.simulation["events"][event.payload["type"]] += 1
-    else:
-        Parameters.simulation["events"][event.payload["type"]] = 1
-        
+    events = Parameters.simulation["events"]
+    events[event.payload.name] = events.get(event.payload.name, 0) + 1
+
     # if node is dead - event will not be handled
     if not event.actor.state.alive:
         return 'dead_node'
     
     # if this event is CP specific and the CP of the event does not mactch the current CP - old message
-    if "CP" in event.payload and event.payload['CP'] != event.actor.state.cp.NAME:
+    if not current_cp(event):
         return 'invalid'
 
     # if network mode is gossip - the node will mutlticast message to it's neighbours
-    # backlog since we don't want want to multicast when cheking backlog
-    if Parameters.network["gossip"] and backlog and isinstance(event, MessageEvent):
+    # (backlogged events are not multicast again - see handle_backlog)
+    if Parameters.network["gossip"] and isinstance(event, MessageEvent):
         Network.multicast(event.actor, event)
 
-    # handlle event using it's respective handler
-    ret = event.handler(event)
+    ret = run_handler(event)
 
     # add event to backlog
-    # if backloged event (when backlog == False) returns backlog -> still future event)
-    if ret == 'backlog' and backlog:
-        bisect.insort(event.actor.backlog, event)
-    elif ret == 'new_state' and backlog:
+    if ret == 'backlog':
+        event.actor.backlog.add(event)
+    elif ret == 'new_state':
         handle_backlog(event.actor)
-    elif ret == 'unhadled':
+
+    return ret
+
+def current_cp(event):
+    '''
+        False if event is CP specific and belongs to a CP other than the current CP of its node
+    '''
+    return event.payload.CP is None or event.payload.CP == event.actor.state.cp.NAME
+
+def run_handler(event):
+    '''
+        handlles event using it's respective handler
+    '''
+    ret = event.handler(event)
+
+    if ret == 'unhadled':
         raise ValueError("Event was not handled by its own handler!")
 
     return ret
 
 def handle_backlog(node):
     '''
-        Tries to handle every event in the backlog - removes handled events
+        Re-handles the backlogged events that may succeed in the new state of node (see CP.BACKLOG_READY)
+        (backlogged events have allready been recorded and counted - they are only passed to their handlers)
+
+        Handled events are removed. Repeats while the node keeps changing state within the same round
+        (the backlog is cleared when the node enters a new round)
     '''
-    remove_list = []
+    backlog = node.backlog
+    generation = backlog.generation
+
+    state = None
+    while node.state.cp_state.state != state:
+        state = node.state.cp_state.state
+
+        for key, seq, event in backlog.ready(node.state.cp.BACKLOG_READY.get(state, ())):
+            tools.debug_logs(
+                msg=lambda: f"{node.__str__(full=True)}", input=lambda: f"HANDLING BACKLOOOG: {event} ", in_col="43", clear=False)
 
-    for event in node.backlog:
-        tools.debug_logs(
-            msg=f"{node.__str__(full=True)}", input=f"HANDLING BACKLOOOG: {event} ", in_col="43", clear=False)
+            ret = run_handler(event) if current_cp(event) else 'invalid'
 
-        ret = handle_event(event, backlog=False)
+            tools.debug_logs(msg=lambda: f"event returned {ret}")
 
-        tools.debug_logs(msg=f"event returned {ret}")
-        
-        if ret == 'handled' or ret == 'new_state' or ret == 'invalid':
-            remove_list.append(event)
+            # event moved the node to a new round - the backlog has been cleared
+            if backlog.generation != generation:
+                return
 
-    # if event causes node to enter new round - backlog is cleared and thus this will error out
-    if node.backlog:
-        for e in remove_list:
-            node.backlog.remove(e)
+            if ret != 'backlog':
+                backlog.remove(key, seq)
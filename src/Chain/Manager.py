@@ -3,6 +3,11 @@ from Chain.Parameters import Parameters
 from Chain.Network import Network
 from Chain.Node import Node
 from Chain.Event import SystemEvent
+from Chain.Metrics import SimulationState
+from Chain.ChainStore import ChainStore
+
+import Chain.Messages as Messages
+import Chain.Recorder as Recorder
 
 import Chain.Consensus.BigFoot.BigFoot as BigFoot
 import Chain.Consensus.PBFT.PBFT as PBFT
@@ -33,6 +38,18 @@ class Manager:
         self.sim = None
         self.behaviour = None
 
+        # simulation time at which debug mode starts (--debug_at)
+        self.debug_at = None
+
+        # system event opcode -> handler
+        self.handlers = Messages.dispatch_table({
+            Messages.APPLY_BEHAVIOUR: self.handle_apply_behavior_event,
+            Messages.NODE_FAULT: self.handle_node_fault_event,
+            Messages.NODE_RECOVERY: self.handle_node_recovery_event,
+            Messages.GENERATE_TXIONS: self.handle_generate_txions_event,
+            Messages.CHANGE_CP: self.handle_change_cp_event,
+        })
+
     def set_up(self):
         '''
             Initial tasks required for the simulation to start
@@ -40,6 +57,13 @@ class Manager:
         # load params (cmd and env)
         tools.set_env_vars_from_config()
         Parameters.load_params_from_config()
+
+        if 'start_debug' in os.environ:
+            self.debug_at = float(os.environ['start_debug'])
+
+        SimulationState.recorder = Recorder.from_config(Parameters.simulation["recorder"])
+        ChainStore.init(Parameters.simulation["chain_store"])
+
         Parameters.application["CP"] = CPs[Parameters.simulation["init_CP"]]
 
         # create simulator
@@ -47,7 +71,7 @@ class Manager:
         self.sim.manager = self
 
         # initialise network
-        Network.init_network(self.sim.nodes) 
+        Network.init_network(self.sim.nodes, self.sim.calendar) 
 
         # initialise behaviour module
         self.behaviour = Behaiviour(self.sim)
@@ -77,7 +101,7 @@ class Manager:
         if isinstance(cp, str):
             cp = CPs[cp]
 
-        tools.debug_logs(msg=f"WILL CHANGE CP TO {cp.NAME}", input="RETURN TO CONFIRM...", col=42)
+        tools.debug_logs(msg=lambda: f"WILL CHANGE CP TO {cp.NAME}", input="RETURN TO CONFIRM...", col=42)
 
         Parameters.application["CP"] = cp
     
@@ -90,8 +114,9 @@ class Manager:
         Parameters.calculate_fault_tolerance()
 
         # create node and gensis block
-        node = Node(self.sim.nodes[-1].id+1)
-        node.add_block(self.sim.nodes[0].blockchain[0].copy(), self.sim.clock)
+        node = Node(self.sim.nodes[-1].id+1, self.sim.calendar)
+        Parameters.simulation['txion_model'].assign_pool(node)
+        node.add_block(self.sim.nodes[0].blockchain[0], self.sim.clock)
         
         # assign a location and neighbours to node
         Network.assign_location_to_nodes(node)
@@ -110,7 +135,11 @@ class Manager:
         node.update(self.sim.clock)
         
         node.state.synced = False
-        Sync.create_local_sync_event(node, choice(node.neighbours), self.sim.clock)
+
+        if Parameters.simulation["join_sync"]["mode"] == "snapshot":
+            Sync.create_snapshot_sync_event(node, choice(node.neighbours), self.sim.clock)
+        else:
+            Sync.create_local_sync_event(node, choice(node.neighbours), self.sim.clock)
 
     def remove_node(self):
         '''
@@ -127,8 +156,10 @@ class Manager:
             Time based updates that are not controlled by system events can be triggered here
         '''
         ################ Start debug at time #################
-        if 'start_debug' in os.environ and int(os.environ['start_debug']) <= self.sim.clock:
+        if self.debug_at is not None and self.debug_at <= self.sim.clock:
             os.environ['debug'] = "True"
+            tools.set_debug(True)
+            self.debug_at = None
     
     def run(self):
         ''' Managed simulation loop'''
@@ -138,23 +169,14 @@ class Manager:
             self.sim.sim_next_event()
             self.update_sim()
 
+        SimulationState.recorder.close()
+
     ################################################################################################
                             ################ SYSTEM EVENTS #################
     ################################################################################################
 
-    def handle_next_event(self):
-        event = self.sim.system_queue.pop_next_event()
-
-        if event.payload["type"] == "apply_behavior":
-            self.handle_apply_behavior_event(event)
-        elif event.payload["type"] == "node fault":
-            self.handle_node_fault_event(event)
-        elif event.payload["type"] == "node recovery":
-            self.handle_node_recovery_event(event)
-        elif event.payload["type"] == "generate_txions":
-            self.handle_generate_txions_event(event)
-        elif event.payload["type"] == "change_cp":
-            self.handle_change_cp_event(event)
+    def handle_next_event(self, event):
+        self.handlers[event.payload.TYPE](event)
 
     ################################################################################################
                             ################ APPLY BEHAVIOUR #################
@@ -163,7 +185,7 @@ class Manager:
     def schedule_apply_behavior_event(self):
         event = SystemEvent(
             time = self.sim.clock + Parameters.behaiviour["behaviour_interval"],
-            payload = {"type": "apply_behavior"}
+            payload = Messages.ApplyBehaviour()
         )
 
         self.sim.system_queue.add_event(event)
@@ -190,16 +212,13 @@ class Manager:
 
         event = SystemEvent(
             time = time,
-            payload={
-                "type": "change_cp",
-                "cp": cp
-            }
+            payload=Messages.ChangeCP(cp)
         )
 
         self.sim.system_queue.add_event(event)
     
     def handle_change_cp_event(self, event):
-        self.change_cp(event.payload["cp"])
+        self.change_cp(event.payload.cp)
         self.schedule_change_cp_event()
 
     ################################################################################################
@@ -211,9 +230,7 @@ class Manager:
 
         event = SystemEvent(
             time = time,
-            payload={
-                "type": "generate_txions",
-            }
+            payload=Messages.GenerateTxions()
         )
         self.sim.system_queue.add_event(event)
 
@@ -225,21 +242,18 @@ class Manager:
         
 
     def handle_node_fault_event(self, event):
-        event.payload["node"].kill()
-        recovery_time = event.time + expovariate(1/event.payload["node"].behaviour.mean_recovery_time)
+        event.payload.node.kill()
+        recovery_time = event.time + expovariate(1/event.payload.node.behaviour.mean_recovery_time)
         event = SystemEvent(
             time = recovery_time,
-            payload = {"type": "node recovery",
-                        "node": event.payload["node"]
-            }
+            payload = Messages.NodeRecovery(event.payload.node)
         )
-        event.payload["node"].behaviour.recovery_event = event
-        self.sim.system_queue.add_event(event)
+        event.payload.node.behaviour.recovery_event = self.sim.system_queue.add_event(event)
     
     def handle_node_recovery_event(self, event):
-        event.payload["node"].resurect()
-        event.payload["node"].behaviour.recovery_event = None
-        event.payload["node"].behaviour.fault_event = None
+        event.payload.node.resurect()
+        event.payload.node.behaviour.recovery_event = None
+        event.payload.node.behaviour.fault_event = None
 
 
 class Behaiviour:
@@ -292,16 +306,13 @@ class Behaiviour:
                 
                 event = SystemEvent(
                     time = next_fault_time,
-                    payload = {"type": "node fault",
-                                "node": fnode
-                    }
+                    payload = Messages.NodeFault(fnode)
                 )
 
                 if fnode.behaviour.fault_event is not None:
-                    self.sim.system_queue.remove_event(fnode.behaviour.fault_event)
+                    fnode.behaviour.fault_event.cancel()
 
-                fnode.behaviour.fault_event = event
-                self.sim.system_queue.add_event(event)
+                fnode.behaviour.fault_event = self.sim.system_queue.add_event(event)
 
 
 
@@ -0,0 +1,225 @@
+'''
+    Typed event payloads
+
+    Every payload is a small __slots__ record. The type of a payload is an integer opcode (TYPE - a class attribute)
+    which handlers use to dispatch through a table (see dispatch_table) instead of comparing strings
+
+    Payloads:
+        PrePrepare, Prepare, Commit, NewBlock - block messages (block, round)
+        PrepareQuorum, CommitQuorum - a batch of votes delivered as one message (block, round, voters)
+        Timeout, FastPathTimeout - CP timeouts (round)
+        RoundChange - round change votes (new_round)
+        LocalSync - high level sync (request_node, blocks, times_added, fail)
+        SnapshotSync - checkpoint sent to a joining node (request_node, blocks - the tip, pool - state summary, fail)
+        ApplyBehaviour, NodeFault, NodeRecovery, GenerateTxions, ChangeCP - system events
+
+    CP: name of the CP the payload belongs to (set by the scheduler - None for non CP events)
+
+    Wire size (see Network.size): every message counts a header, each field in FIELDS (a block counts its size,
+    voters counts one vote per voter, any other field counts as a plain field) and the VOTES it carries.
+    The size is computed once and cached on the payload (wire_size)
+'''
+
+########################## OPCODES ###########################
+
+PRE_PREPARE = 0
+PREPARE = 1
+COMMIT = 2
+NEW_BLOCK = 3
+TIMEOUT = 4
+FAST_PATH_TIMEOUT = 5
+ROUND_CHANGE = 6
+LOCAL_FAST_SYNC = 7
+APPLY_BEHAVIOUR = 8
+NODE_FAULT = 9
+NODE_RECOVERY = 10
+GENERATE_TXIONS = 11
+CHANGE_CP = 12
+SNAPSHOT_SYNC = 13
+
+# name of each opcode (index = opcode)
+NAMES = (
+    "pre_prepare", "prepare", "commit", "new_block",
+    "timeout", "fast_path_timeout", "round_change", "local_fast_sync",
+    "apply_behavior", "node fault", "node recovery", "generate_txions", "change_cp",
+    "snapshot_sync",
+)
+
+
+def dispatch_table(handlers):
+    '''
+        returns a dispatch table (list indexed by opcode) from a {opcode: handler} map
+        opcodes without a handler map to None
+    '''
+    table = [None] * len(NAMES)
+    for opcode, handler in handlers.items():
+        table[opcode] = handler
+    return table
+
+########################## PAYLOADS ###########################
+
+class Payload:
+    '''
+        Base payload - FIELDS lists the data fields of the payload (used for printing and message sizing)
+    '''
+    __slots__ = ('CP', 'wire_size')
+    TYPE = None
+    FIELDS = ()
+    # votes (signatures) carried by the message
+    VOTES = 0
+
+    def __init__(self):
+        self.CP = None
+
+    @property
+    def name(self):
+        return NAMES[self.TYPE]
+
+    def items(self):
+        '''
+            (key, value) pairs of the payload (in the same form as the old payload dicts)
+        '''
+        return [('type', self.name)] + [(f, getattr(self, f)) for f in self.FIELDS] + \
+            ([('CP', self.CP)] if self.CP is not None else [])
+
+    def __repr__(self):
+        return str(dict(self.items()))
+
+
+class BlockMessage(Payload):
+    __slots__ = ('block', 'round')
+    FIELDS = ('block', 'round')
+
+    def __init__(self, block, round):
+        self.CP = None
+        self.block = block
+        self.round = round
+
+
+class PrePrepare(BlockMessage):
+    __slots__ = ()
+    TYPE = PRE_PREPARE
+
+
+class Prepare(BlockMessage):
+    __slots__ = ()
+    TYPE = PREPARE
+    VOTES = 1
+
+
+class Commit(BlockMessage):
+    __slots__ = ()
+    TYPE = COMMIT
+    VOTES = 1
+
+
+class NewBlock(BlockMessage):
+    __slots__ = ()
+    TYPE = NEW_BLOCK
+
+
+class PrepareQuorum(Prepare):
+    __slots__ = ('voters',)
+    FIELDS = ('block', 'round', 'voters')
+    VOTES = 0
+
+    def __init__(self, block, round, voters):
+        super().__init__(block, round)
+        self.voters = voters
+
+
+class CommitQuorum(Commit):
+    __slots__ = ('voters',)
+    FIELDS = ('block', 'round', 'voters')
+    VOTES = 0
+
+    def __init__(self, block, round, voters):
+        super().__init__(block, round)
+        self.voters = voters
+
+
+class Timeout(Payload):
+    __slots__ = ('round',)
+    TYPE = TIMEOUT
+    FIELDS = ('round',)
+
+    def __init__(self, round):
+        self.CP = None
+        self.round = round
+
+
+class FastPathTimeout(Timeout):
+    __slots__ = ()
+    TYPE = FAST_PATH_TIMEOUT
+
+
+class RoundChange(Payload):
+    __slots__ = ('new_round',)
+    TYPE = ROUND_CHANGE
+    FIELDS = ('new_round',)
+
+    def __init__(self, new_round):
+        self.CP = None
+        self.new_round = new_round
+
+
+class LocalSync(Payload):
+    __slots__ = ('request_node', 'blocks', 'times_added', 'fail')
+    TYPE = LOCAL_FAST_SYNC
+    FIELDS = ('request_node', 'blocks', 'times_added', 'fail')
+
+    def __init__(self, request_node, blocks, times_added, fail):
+        self.CP = None
+        self.request_node = request_node
+        self.blocks = blocks
+        self.times_added = times_added
+        self.fail = fail
+
+
+class SnapshotSync(Payload):
+    __slots__ = ('request_node', 'blocks', 'pool', 'fail')
+    TYPE = SNAPSHOT_SYNC
+    FIELDS = ('request_node', 'blocks', 'pool', 'fail')
+
+    def __init__(self, request_node, blocks, pool, fail):
+        self.CP = None
+        self.request_node = request_node
+        self.blocks = blocks
+        self.pool = pool
+        self.fail = fail
+
+########################## SYSTEM PAYLOADS ###########################
+
+class ApplyBehaviour(Payload):
+    __slots__ = ()
+    TYPE = APPLY_BEHAVIOUR
+
+
+class GenerateTxions(Payload):
+    __slots__ = ()
+    TYPE = GENERATE_TXIONS
+
+
+class NodeFault(Payload):
+    __slots__ = ('node',)
+    TYPE = NODE_FAULT
+    FIELDS = ('node',)
+
+    def __init__(self, node):
+        self.CP = None
+        self.node = node
+
+
+class NodeRecovery(NodeFault):
+    __slots__ = ()
+    TYPE = NODE_RECOVERY
+
+
+class ChangeCP(Payload):
+    __slots__ = ('cp',)
+    TYPE = CHANGE_CP
+    FIELDS = ('cp',)
+
+    def __init__(self, cp):
+        self.CP = None
+        self.cp = cp
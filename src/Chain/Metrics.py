@@ -2,6 +2,8 @@ import pickle
 import statistics as st
 from Chain.Parameters import Parameters
 
+import Chain.Recorder as Recorder
+
 import matplotlib.pyplot as plt
 import numpy as np
 class SimulationState:
@@ -9,7 +11,9 @@ class SimulationState:
         Stores the state of the simulation.
     '''
     blockchain_state = {}
-    events = {"consensus":{}, "other": {}}
+
+    # records the handled events (see Recorder) - set up by the manager from simulation.recorder
+    recorder = Recorder.NullRecorder()
 
     @staticmethod
     def store_state(sim):
@@ -26,18 +30,7 @@ class SimulationState:
 
     @staticmethod
     def store_event(event):
-        if 'block' in event.payload.keys():
-            block_id = event.payload['block'].id
-            if block_id in SimulationState.events["consensus"].keys():
-                SimulationState.events["consensus"][block_id].append(event.to_serializable())
-            else:
-                SimulationState.events["consensus"][block_id] = [event.to_serializable()] 
-        else:
-            type = event.payload['type']
-            if type in SimulationState.events["other"].keys():
-                SimulationState.events[type].append(event.to_serializable())
-            else:
-                SimulationState.events[type] = [event.to_serializable()]
+        SimulationState.recorder.record(event)
             
 class Metrics:
     latency = {}
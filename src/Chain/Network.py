@@ -1,36 +1,129 @@
 from Chain.Event import MessageEvent
+from Chain.EventQueue import Fanout
 from Chain.Parameters import Parameters
 
 import Chain.tools as tools
+import Chain.NetworkData as NetworkData
 
 import numpy as np, glob, pandas as pd
-from sys import getsizeof
 
 import random
 
-import json
+from operator import itemgetter
+
+class NormalBatches:
+    '''
+        Standard normal samples drawn in batches of 'batch' from a dedicated numpy Generator
+        (seeded from the global numpy random state - seeded runs stay reproducible)
+    '''
+    def __init__(self, batch):
+        self.rng = np.random.default_rng(np.random.randint(2**32 - 1))
+        self.batch = batch
+        self.samples = self.rng.standard_normal(batch)
+        self.pos = 0
+
+    def next(self):
+        if self.pos == len(self.samples):
+            self.samples = self.rng.standard_normal(self.batch)
+            self.pos = 0
+
+        self.pos += 1
+        return self.samples.item(self.pos - 1)
+
+    def take(self, n):
+        '''
+            next n samples (numpy array)
+        '''
+        if self.pos + n > len(self.samples):
+            self.samples = np.concatenate([self.samples[self.pos:], self.rng.standard_normal(max(self.batch, n))])
+            self.pos = 0
+
+        self.pos += n
+        return self.samples[self.pos - n:self.pos]
+
 
 class Network:
     '''
         Models the blockchain p2p network
             nodes: list of BP's
             locations: list of various locations node can be in
-            latency_map: map of propgation latencies between locations
+            (the latencies / distances between locations are read from the compiled datasets - see NetworkData)
+
+        Delays are computed on demand per message - memory never grows with O(nodes^2):
+            slot_locations / slot_bandwidths: location index and bandwidth of every node slot (the node id)
+                              kept up to date as nodes are added or change (see update_location / update_bandwidth)
+        the delay of a message is size / min(bandwidths) + the base delay of the link (propagation latency +
+        queueing + processing delay - see link / links) given by network.latency_model:
+            city - location_latency / location_dev: matrices of every pair of locations - O(locations^2)
+            hierarchical - continent -> region -> city -> intra-city (see init_hierarchy) - O(regions^2 + locations):
+                region_latency / region_dev: base delay / dev between every pair of regions (mean over their city
+                                             pairs - the continent pair fills in region pairs without measurements)
+                location_region / location_offset: region of each city and how much slower (or faster) its links
+                                             are than its region's
+                the link between cities a and b: region_latency[region(a), region(b)] + offset(a) + offset(b)
+                nodes in the same city: the intra-city latency / dev (same_city_latency_ms / same_city_dev_ms)
+
+        Stochastic latency (network.latency_jitter - measured latencies only): the latency of each message gets
+        normal jitter with the dev of the link (dev * a pre-drawn sample - truncated at 0)
     '''
     nodes = None
+    calendar = None
     locations = None
-    latency_map = None
-    distance_map = None
+
+    # fixed part of the wire size of each payload type (see wire_size)
+    wire = {}
+
+    # base delay / dev of the latency between each pair of locations (index - see location_index)
+    location_latency = None
+    location_dev = None
+    location_index = None
+
+    # hierarchical latency model (None - city model)
+    region_latency = None
+    region_dev = None
+    location_region = None
+    location_offset = None
+    intra_city = None
+
+    # location index and bandwidth of each slot (node id)
+    slot_locations = None
+    slot_bandwidths = None
+
+    # jitter samples (None - no jitter)
+    jitter = None
     
     @staticmethod
     def size(msg):
-        size = Parameters.network["base_msg_size"]
+        '''
+            wire size of msg - computed once and cached on the payload (see Messages):
+                base_msg_size (header) + field_size per field + vote_size per vote + block size
+        '''
+        payload = msg.payload
+        size = getattr(payload, "wire_size", None)
 
-        for key in msg.payload:
-            if key == "block":
-                size += msg.payload[key].size
-            else:
-                size += float(getsizeof(msg.payload[key])/1000000)
+        if size is None:
+            size = Network.wire_size(payload)
+            payload.wire_size = size
+
+        return size
+
+    @staticmethod
+    def wire_size(payload):
+        # the part that only depends on the type of the payload is computed once per type
+        fixed = Network.wire.get(type(payload))
+
+        if fixed is None:
+            fields = [f for f in payload.FIELDS if f not in ("block", "voters")]
+            fixed = Parameters.network["base_msg_size"] + \
+                len(fields) * Parameters.network["field_size"] + payload.VOTES * Parameters.network["vote_size"]
+            Network.wire[type(payload)] = fixed
+
+        size = fixed
+
+        if "block" in payload.FIELDS:
+            size += payload.block.size
+        if "voters" in payload.FIELDS:
+            size += len(payload.voters) * Parameters.network["vote_size"]
 
         return size
 
@@ -44,23 +137,30 @@ class Network:
     @staticmethod
     def multicast(node, event):
         for n in node.neighbours:
-            msg = MessageEvent.from_Event(event, n)
-            Network.gossip_message(node, n, msg)
+            Network.gossip_message(node, n, event)
 
     @staticmethod
-    def gossip_message(sender, receiver, msg):
+    def gossip_message(sender, receiver, event):
         # if the receiver has received this event (ignore) or the receiver created the message
-        if receiver.queue.contains_event_message(msg) or msg.creator == receiver:
+        if receiver.queue.contains_event_message(event) or event.creator == receiver:
             return 0
 
-        Network.message(sender, receiver, msg)
+        Network.message(sender, receiver, MessageEvent.from_Event(event, receiver))
 
     @staticmethod
     def broadcast(node, event):
-        for n in Network.nodes:
-            if n != node:
-                msg = MessageEvent.from_Event(event, n)
-                Network.message(node, n, msg)
+        '''
+            Sends event to every other online node
+            The message is sized once, its delays are computed in one step (see delays) and its deliveries
+            are scheduled lazily as one calendar entry (see EventQueue.Fanout)
+        '''
+        size = Network.size(event)
+
+        receivers = [n for n in Network.nodes if n != node and n.state.alive]
+
+        if receivers:
+            times = (event.time + Network.delays(node, receivers, size)).tolist()
+            Fanout(Network.calendar, event, sorted(zip(times, receivers), key=itemgetter(0)))
 
     @staticmethod
     def message(sender, receiver, msg, delay=True):
@@ -72,18 +172,19 @@ class Network:
         receiver.add_event(msg)
 
     @staticmethod
-    def init_network(nodes, speeds=None):
+    def init_network(nodes, calendar, speeds=None):
         ''' 
             Initialises the Netowrk modules
-                - Gets a refenrence to the node list
-                - Calculates latency_map and locations
+                - Gets a refenrence to the node list and the event calendar
+                - Loads the locations and the latencies / distances between them (only the ones in use)
                 - Assigns locations and bandwidth to nodes
                 - Assigns neibhours to nodes (Gossip, Sync etc...)
         '''
         Network.nodes = nodes
+        Network.calendar = calendar
+        Network.wire = {}
 
-        Network.parse_latencies()
-        Network.parse_distances()
+        Network.init_delay_matrices()
     
         Network.assign_location_to_nodes()
 
@@ -102,6 +203,9 @@ class Network:
             else:
                 node.bandwidth = random.normalvariate(Parameters.network["bandwidth"]["mean"], Parameters.network["bandwidth"]["dev"])
                 print(node.bandwidth)
+
+            Network.update_bandwidth(node)
+
     @staticmethod
     def assign_neighbours(node=None):
         '''
@@ -110,26 +214,112 @@ class Network:
             if node is provided assign to just that node
         '''
         if node is None:
-            for n in Network.nodes:
-                Network.assign_neighbours(n)
+            for i, n in enumerate(Network.nodes):
+                n.neighbours = Network.sample_neighbours(i)
         else:
-            node.neighbours = random.sample(
-                [x for x in Network.nodes if x != node],
-                Parameters.network["num_neighbours"])
+            # a node that is joining is not in the list yet
+            i = Network.nodes.index(node) if node in Network.nodes else len(Network.nodes)
+            node.neighbours = Network.sample_neighbours(i)
+
+    @staticmethod
+    def sample_neighbours(position):
+        '''
+            samples num_neighbours nodes other than the node at position (in Network.nodes)
+            samples positions - picking the same nodes as sampling the list of the other nodes without building it
+        '''
+        nodes = Network.nodes
+        others = len(nodes) - 1 if position < len(nodes) else len(nodes)
+
+        return [nodes[j if j < position else j + 1]
+                for j in random.sample(range(others), Parameters.network["num_neighbours"])]
 
     @staticmethod
     def calculate_message_propagation_delay(sender, receiver, message_size):
         '''
             Calculates the message propagation delay as
             transmission delay + propagation delay + queueing delay + processing_delay
+            (the last three are precomputed for every pair of locations - see init_delay_matrices)
+        '''
+        latency, dev = Network.link(Network.slot_locations.item(sender.id), Network.slot_locations.item(receiver.id))
+
+        if Network.jitter is not None:
+            latency = max(latency + dev * Network.jitter.next(), 0.0)
+
+        return message_size / Network.get_bandwidth(sender, receiver) + latency
+
+    @staticmethod
+    def delays(sender, receivers, message_size):
+        '''
+            propagation delays (numpy array) of a message from sender to each of the receivers
+        '''
+        slots = [r.id for r in receivers]
+        latency, dev = Network.links(Network.slot_locations.item(sender.id), Network.slot_locations[slots])
+
+        if Network.jitter is not None:
+            latency = np.maximum(latency + dev * Network.jitter.take(len(slots)), 0.0)
+
+        bandwidth = np.minimum(Network.slot_bandwidths.item(sender.id), Network.slot_bandwidths[slots])
+
+        return message_size / bandwidth + latency
+
+    @staticmethod
+    def link(src, dst):
+        '''
+            base delay and dev of the link between locations src and dst
+        '''
+        if Network.region_latency is None:
+            return Network.location_latency.item(src, dst), Network.location_dev.item(src, dst)
+
+        if src == dst:
+            return Network.intra_city
+
+        a, b = Network.location_region.item(src), Network.location_region.item(dst)
+
+        return Network.region_latency.item(a, b) + Network.location_offset.item(src) + \
+            Network.location_offset.item(dst), Network.region_dev.item(a, b)
+
+    @staticmethod
+    def links(src, dst):
+        '''
+            base delays and devs (numpy arrays) of the links between location src and the locations dst
         '''
-        # transmission delay
-        delay = message_size / Network.get_bandwidth(sender, receiver)
+        if Network.region_latency is None:
+            return Network.location_latency[src, dst], Network.location_dev[src, dst]
+
+        a, b = Network.location_region.item(src), Network.location_region[dst]
+
+        latency = Network.region_latency[a, b] + Network.location_offset.item(src) + Network.location_offset[dst]
+        dev = Network.region_dev[a, b]
+
+        same = dst == src
+        if same.any():
+            latency = np.where(same, Network.intra_city[0], latency)
+            dev = np.where(same, Network.intra_city[1], dev)
+
+        return latency, dev
+
+    @staticmethod
+    def init_delay_matrices():
+        '''
+            computes the base delay between every pair of locations (reduced to the hierarchy with
+            latency_model: hierarchical - see init_hierarchy) and allocates the per slot arrays
+            base delay: propagation + queueing + processing delay (everything but the transmission delay)
+        '''
+        Network.locations = NetworkData.cities().tolist()
+        Network.location_index = {loc: i for i, loc in enumerate(Network.locations)}
+
+        dev = None
 
         if Parameters.network["use_latency"] == "measured":
-            delay += Network.latency_map[sender.location][receiver.location][0] / 1000
+            measured = NetworkData.latencies()
+            latency, dev = measured[:, :, 0].astype(float), measured[:, :, 1].astype(float)
+
+            np.fill_diagonal(latency, Parameters.network["same_city_latency_ms"])
+            np.fill_diagonal(dev, Parameters.network["same_city_dev_ms"])
+
+            base = latency / 1000
         elif Parameters.network["use_latency"] == "distance":
-            dist = Network.distance_map[sender.location][receiver.location]
+            dist = NetworkData.distances().astype(float)
             dist = dist * 0.621371 # conversion to miles since formula is based on miles
             '''
                 y = 0.022x + 4.862 is fitted to match the round trip latency between 2
@@ -139,12 +329,108 @@ class Network:
                 / 2 to get the single trip latency
                 / 1000 to get seconds (formula fitted on ms)
             '''
-            delay += ((0.022 * dist + 4.862) / 2) / 1000
-        
+            base = ((0.022 * dist + 4.862) / 2) / 1000
+        else:
+            base = np.zeros((len(Network.locations), len(Network.locations)))
+
+        latency = base + (Parameters.network["queueing_delay"] + Parameters.network["processing_delay"])
+
+        if Parameters.network["latency_jitter"] and dev is not None:
+            dev = dev / 1000
+            Network.jitter = NormalBatches(Parameters.network["jitter_batch"])
+        else:
+            dev = np.zeros_like(latency)
+            Network.jitter = None
+
+        if Parameters.network["latency_model"] == "hierarchical":
+            Network.init_hierarchy(latency, dev)
+            Network.location_latency = Network.location_dev = None
+        elif Parameters.network["latency_model"] == "city":
+            Network.location_latency, Network.location_dev = latency, dev
+            Network.region_latency = Network.region_dev = Network.location_region = Network.location_offset = None
+        else:
+            raise ValueError(f"Unknown latency_model '{Parameters.network['latency_model']}' - available: city, hierarchical")
+
+        Network.slot_locations = np.zeros(0, dtype=np.int64)
+        Network.slot_bandwidths = np.zeros(0)
+
+        Network.reserve(len(Network.nodes))
+
+    @staticmethod
+    def init_hierarchy(latency, dev):
+        '''
+            reduces the location matrices to the hierarchical model (the matrices are dropped after this):
+                region_latency / region_dev - mean over the pairs of different cities of each pair of regions
+                (pairs of regions without any - e.g a region with a single city - take their continents' mean)
+                location_offset - mean difference between the links of a city and the links of its region
+                intra_city - (latency, dev) between nodes in the same city (the diagonal of the matrices)
+        '''
+        regions, continents = NetworkData.city_regions(), NetworkData.region_continents()
+        cities = len(regions)
+
+        pairs = ~np.eye(cities, dtype=bool)
+        ci, cj = np.nonzero(pairs)
+
+        def means(groups, count, values):
+            sums, counts = np.zeros((count, count)), np.zeros((count, count))
+            np.add.at(sums, (groups[ci], groups[cj]), values[ci, cj])
+            np.add.at(counts, (groups[ci], groups[cj]), 1)
+
+            with np.errstate(divide='ignore', invalid='ignore'):
+                return sums / counts
+
+        region_latency, region_dev = means(regions, len(continents), latency), means(regions, len(continents), dev)
+
+        city_continents = continents[regions]
+        continent_latency = means(city_continents, continents.max() + 1, latency)
+        continent_dev = means(city_continents, continents.max() + 1, dev)
 
-        delay += Parameters.network["queueing_delay"] + Parameters.network["processing_delay"]
+        missing = np.isnan(region_latency)
+        ri, rj = np.nonzero(missing)
+        region_latency[missing] = continent_latency[continents[ri], continents[rj]]
+        region_dev[missing] = continent_dev[continents[ri], continents[rj]]
 
-        return delay
+        # pairs of regions no measurement reaches (no pairs of cities in the continents either) - overall mean
+        region_latency[np.isnan(region_latency)] = latency[pairs].mean()
+        region_dev[np.isnan(region_dev)] = dev[pairs].mean()
+
+        residual = np.where(pairs, latency - region_latency[regions[:, None], regions[None, :]], 0.0)
+
+        Network.region_latency = region_latency
+        Network.region_dev = region_dev
+        Network.location_region = np.asarray(regions, dtype=np.int64)
+        Network.location_offset = residual.sum(axis=1) / (cities - 1)
+        Network.intra_city = (float(np.diag(latency).mean()), float(np.diag(dev).mean()))
+
+    @staticmethod
+    def reserve(slots):
+        '''
+            grows the per slot arrays (doubling) so they hold at least 'slots' slots
+        '''
+        capacity = len(Network.slot_locations)
+        if slots <= capacity:
+            return
+
+        new = max(slots, 2 * capacity)
+
+        Network.slot_locations = np.concatenate([Network.slot_locations, np.zeros(new - capacity, dtype=np.int64)])
+        Network.slot_bandwidths = np.concatenate([Network.slot_bandwidths, np.full(new - capacity, np.nan)])
+
+    @staticmethod
+    def update_location(node):
+        '''
+            updates the location index of node (after its location changed)
+        '''
+        Network.reserve(node.id + 1)
+        Network.slot_locations[node.id] = Network.location_index[node.location]
+
+    @staticmethod
+    def update_bandwidth(node):
+        '''
+            updates the bandwidth of node (after its bandwidth changed)
+        '''
+        Network.reserve(node.id + 1)
+        Network.slot_bandwidths[node.id] = node.bandwidth
 
     @staticmethod
     def assign_location_to_nodes(node=None, location=None):
@@ -156,7 +442,9 @@ class Network:
         if node is None:
             for n in Network.nodes:
                 n.location = random.choice(Network.locations)
-                tools.debug_logs(msg=f"{n}: {n.location}")
+                tools.debug_logs(msg=lambda: f"{n}: {n.location}")
+
+                Network.update_location(n)
 
         else:
             if location is None:
@@ -164,37 +452,8 @@ class Network:
             else:
                 node.location = location
 
+            Network.update_location(node)
+
     @staticmethod
     def get_bandwidth(sender, receiver):
-        return min(sender.bandwidth, receiver.bandwidth)
-    
-    @staticmethod
-    def parse_latencies():
-        '''
-            Initialised the Network.locations list the Network.latency map from the JSON dataset
-        '''
-        Network.locations = []
-        Network.latency_map = {}
-
-        with open("NetworkLatencies/latency_map.json","rb") as f:
-            Network.latency_map = json.load(f)
-        
-        Network.locations = list(Network.latency_map.keys())
-
-        for loc in Network.locations:
-            Network.latency_map[loc][loc] = (
-                Parameters.network["same_city_latency_ms"],
-                Parameters.network["same_city_dev_ms"]
-            )
-    
-    def parse_distances():
-        Network.locations = []
-        Network.distance_map = {}
-    
-        with open("NetworkLatencies/distance_map.json","rb") as f:
-            Network.distance_map = json.load(f)
-        
-        # overwritting the locations is fine to gurantee that they exists 
-        # (this is the case if we laoded latencied before and prevents an error if we dont want to use latencies)
-        Network.locations = list(Network.distance_map.keys())
-
+        return min(Network.slot_bandwidths.item(sender.id), Network.slot_bandwidths.item(receiver.id))
@@ -0,0 +1,112 @@
+'''
+    Network datasets (NetworkLatencies) - latencies and distances between the cities nodes can be located in
+
+    The JSON maps are compiled once into .npy files next to them:
+        cities.npy - the city of each row/column
+        latency.npy - (cities, cities, 2) float32 matrix of the measured latency (mean, dev) in ms
+        distance.npy - (cities, cities) float32 matrix of the distances in km
+        city_regions.npy - region index of each city (region_map.json: continent -> region -> cities)
+        region_continents.npy - continent index of each region
+
+    The .npy files are opened as read only memory maps (processes running side by side share the same pages)
+    and only when needed (e.g the distances are never read when use_latency is measured).
+    They are (re)compiled automatically when missing or older than the JSON - or explicitly:
+        run from src: python -m Chain.NetworkData
+'''
+import numpy as np
+
+import json
+import os
+
+DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, "NetworkLatencies")
+
+SOURCES = ("latency_map.json", "distance_map.json", "region_map.json")
+COMPILED = ("cities.npy", "latency.npy", "distance.npy", "city_regions.npy", "region_continents.npy")
+
+
+def path(name):
+    return os.path.join(DIR, name)
+
+
+def save(name, array):
+    '''
+        writes array to name atomically (so processes compiling at the same time never read a partial file)
+    '''
+    tmp = path(f"{name}.{os.getpid()}.tmp")
+    with open(tmp, "wb") as f:
+        np.save(f, array)
+    os.replace(tmp, path(name))
+
+
+def build():
+    '''
+        compiles the JSON maps into the .npy files
+    '''
+    with open(path("latency_map.json"), "rb") as f:
+        latency_map = json.load(f)
+    with open(path("distance_map.json"), "rb") as f:
+        distance_map = json.load(f)
+    with open(path("region_map.json"), "rb") as f:
+        region_map = json.load(f)
+
+    cities = list(latency_map.keys())
+
+    latency = np.array([[latency_map[src][dst] for dst in cities] for src in cities], dtype=np.float32)
+    distance = np.array([[distance_map[src][dst] for dst in cities] for src in cities], dtype=np.float32)
+
+    regions = [(region, continent) for continent, rs in enumerate(region_map.values()) for region in rs.values()]
+    city_region = {city: r for r, (region, _) in enumerate(regions) for city in region}
+
+    missing = [city for city in cities if city not in city_region]
+    if missing:
+        raise ValueError(f"cities missing from region_map.json: {missing}")
+
+    save("latency.npy", latency)
+    save("distance.npy", distance)
+    save("city_regions.npy", np.array([city_region[city] for city in cities], dtype=np.int64))
+    save("region_continents.npy", np.array([continent for _, continent in regions], dtype=np.int64))
+    # cities last - its timestamp marks a complete compilation
+    save("cities.npy", np.array(cities))
+
+
+def stale():
+    '''
+        True if the compiled files are missing or older than the JSON maps
+    '''
+    if not all(os.path.exists(path(name)) for name in COMPILED):
+        return True
+
+    compiled = min(os.path.getmtime(path(name)) for name in COMPILED)
+    return any(os.path.getmtime(path(name)) > compiled for name in SOURCES)
+
+
+def load(name):
+    if stale():
+        build()
+
+    return np.load(path(name), mmap_mode='r')
+
+
+def cities():
+    return load("cities.npy")
+
+
+def latencies():
+    return load("latency.npy")
+
+
+def distances():
+    return load("distance.npy")
+
+
+def city_regions():
+    return load("city_regions.npy")
+
+
+def region_continents():
+    return load("region_continents.npy")
+
+
+if __name__ == "__main__":
+    build()
+    print(f"compiled {', '.join(COMPILED)} in {os.path.normpath(DIR)}")
@@ -1,4 +1,6 @@
-from Chain.EventQueue import Queue
+from Chain.EventQueue import Queue, Backlog
+from Chain.EventCalendar import EventHandle
+from Chain.ChainStore import ChainStore
 from Chain.Scheduler import Scheduler
 
 from Chain.Parameters import Parameters
@@ -15,7 +17,7 @@ class Node():
 
     Attributes:
         id: unique node id
-        blockchain: list of blocks
+        blockchain: the blocks of the node (index = depth - see ChainStore)
         pool: list of new transactions not yet added to blocks
         bloks: No. of blocks
         state: A namespace denoting the sate of the node
@@ -26,6 +28,7 @@ class Node():
             extra_data: a map sotring extra data needed in the node
 
         Queue: The event queue sotring events (used in the simulation)
+            queue and sync_queue are views onto the global event calendar (see EventCalendar)
 
         Backlog: Stores 'future' events
             When current event cannot be executed (due to message delays
@@ -42,10 +45,11 @@ class Node():
         p: Simulation parameters
     '''
 
-    def __init__(self, id):
+    def __init__(self, id, calendar):
         self.id = id
-        self.blockchain = []
-        self.pool = []
+        self.blockchain = ChainStore()
+        # view of the shared mempool (assigned by the TransactionFactory)
+        self.pool = None
         self.blocks = 0
 
         self.neighbours = None
@@ -74,10 +78,10 @@ class Node():
 
         self.scheduler = Scheduler(self)
 
-        self.queue = Queue()
-        self.sync_queue = Queue()
+        self.queue = Queue(calendar, self)
+        self.sync_queue = Queue(calendar, self)
 
-        self.backlog = []
+        self.backlog = Backlog()
     
     def __repr__(self):
         if self.state.alive:
@@ -118,19 +122,6 @@ class Node():
     def last_block(self):
         return self.blockchain[-1]
 
-    @property
-    def next_event(self):
-        '''
-            returns next event (without removing for queue)
-        '''
-        sync_time = self.sync_queue.time_next
-        main_time = self.queue.time_next
-
-        if sync_time is None or main_time < sync_time:
-            return self.queue.get_next_event()
-        else:
-            return self.sync_queue.get_next_event()
-    
     @property
     def behaviour_state_to_string(self):
         s = ""
@@ -149,8 +140,8 @@ class Node():
     def to_serializable(self):
         return {
             "id": self.id,
-            "blockchain": [x.to_serializable() for x in self.blockchain[1:]], # ignore genesis block
-            "pool": self.pool,
+            "blockchain": [x.to_serializable(t) for x, t in zip(self.blockchain[1:], self.blockchain.times_from(1).tolist())], # ignore genesis block
+            "pool": list(self.pool),
             "blocks": self.blocks,
 
             "neighbours": [x.id for x in self.neighbours], 
@@ -176,8 +167,10 @@ class Node():
         return False
 
     def reset(self):
-        self.state.cp.clean_up(self)
-        self.backlog = []
+        # a node that just joined has no CP yet
+        if self.state.cp is not None:
+            self.state.cp.clean_up(self)
+        self.backlog.clear()
 
     def stored_txions(self, num=None):
         '''
@@ -186,7 +179,7 @@ class Node():
         if num is not None:
             num = -num
 
-        return [x.id for x in self.pool[num:]]
+        return [x.id for x in list(self.pool)[num:]]
 
     def blockchain_length(self):
         return len(self.blockchain)-1
@@ -210,19 +203,24 @@ class Node():
     def resurect(self):
         self.state.alive = True
 
+        # events held back while the node was offline
+        self.queue.unpark()
+        self.sync_queue.unpark()
+
     def add_block(self, block, time):
         '''
             Adds 'block' to blockchain at time 'time'
         '''
-        block.time_added = time
-        self.blockchain.append(block)
+        self.blockchain.append(block, time)
 
         # update transaction pool removed verified transactions
-        ids = [x.id for x in block.transactions]
-        self.pool = [x for x in self.pool if x.id not in ids]
+        self.pool.commit(block.transactions)
 
     def add_event(self, event):
-        ''' adds event to the queue of the node if the node is online'''
+        ''' 
+            adds event to the queue of the node if the node is online
+            returns the handle of the event (allready cancelled if the node is offline)
+        '''
 
         '''
             TODO: Is there ever a case where a local event would need to be added
@@ -230,21 +228,12 @@ class Node():
         '''
 
         if self.state.alive:
-            self.queue.add_event(event)
+            return self.queue.add_event(event)
 
-    def handle_next_event(self):
+        return EventHandle.detached(event)
+
+    def handle_next_event(self, event):
         ''' 
-            handles the next event of the current node
+            handles the next event of the current node (popped from the global calendar)
         '''
-        sync_time = self.sync_queue.time_next
-        main_time = self.queue.time_next
-
-        if sync_time is None or main_time < sync_time:
-            event = self.queue.pop_next_event()
-        else:
-            event = self.sync_queue.pop_next_event()
-
         Handler.handle_event(event)
-
-    def remove_event(self, event):
-        self.queue.remove_event(event)
@@ -57,7 +57,6 @@ class Parameters:
         Parameters.network = params["network"]
 
         Parameters.application = params["application"]
-        Parameters.application["txIDS"] = 0 # incremental txion ids starting on...
         Parameters.calculate_fault_tolerance()
 
         Parameters.execution = params["execution"]
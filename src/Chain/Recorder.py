@@ -0,0 +1,171 @@
+'''
+    Event recorders - record the events handled during the simulation (see Handler.handle_event)
+
+    Sinks (simulation.recorder.sink):
+        none - records nothing (throughput runs)
+        memory - keeps every event in memory (events["consensus"][block_id] / events["other"][type])
+        sampled - like memory but only keeps every Nth event (of the selected types)
+        stream - writes compact records (time, type, creator, receiver, block) to a csv file
+                 in batches from a background thread - memory stays flat however long the run is
+'''
+import Chain.Messages as Messages
+
+from queue import Queue, Full
+from threading import Thread
+
+import csv
+
+
+class NullRecorder:
+    '''
+        Records nothing
+    '''
+    def record(self, event):
+        pass
+
+    def close(self):
+        pass
+
+
+class MemoryRecorder:
+    '''
+        Keeps the serialized events in memory
+            consensus: events carrying a block (grouped by block id)
+            other: the rest of the events (grouped by type)
+    '''
+    def __init__(self):
+        self.events = {"consensus": {}, "other": {}}
+
+    def record(self, event):
+        if isinstance(event.payload, Messages.BlockMessage):
+            group, key = self.events["consensus"], event.payload.block.id
+        else:
+            group, key = self.events["other"], event.payload.name
+
+        if key in group:
+            group[key].append(event.to_serializable())
+        else:
+            group[key] = [event.to_serializable()]
+
+    def close(self):
+        pass
+
+
+class SampledRecorder(MemoryRecorder):
+    '''
+        Keeps every 'every'-th event of the given types in memory (all types if types is empty)
+    '''
+    def __init__(self, every=1, types=None):
+        super().__init__()
+        self.every = every
+        self.types = set(types) if types else None
+        self.seen = 0
+
+    def record(self, event):
+        if self.types is not None and event.payload.name not in self.types:
+            return
+
+        self.seen += 1
+        if self.seen % self.every == 0:
+            super().record(event)
+
+
+class StreamRecorder:
+    '''
+        Writes events to a csv file - records are collected in batches and written by a background thread
+
+        The file is opened up front (a bad path fails when the recorder is created). If writing fails the
+        writer thread stores the error and stops - the next record/close raises it
+    '''
+    _HEADER = ("time", "type", "creator", "receiver", "block")
+
+    def __init__(self, path, batch=10_000):
+        self.path = path
+        self.batch_size = batch
+        self.batch = []
+
+        self.file = open(path, "w", newline="")
+        self.error = None
+
+        # at most a few batches wait to be written (bounds the memory used if the disk falls behind)
+        self.batches = Queue(maxsize=4)
+        self.writer = Thread(target=self._write, daemon=True)
+        self.writer.start()
+
+    def _write(self):
+        try:
+            with self.file as f:
+                writer = csv.writer(f)
+                writer.writerow(StreamRecorder._HEADER)
+
+                while (batch := self.batches.get()) is not None:
+                    writer.writerows(batch)
+        except Exception as e:
+            self.error = e
+
+    def _check(self):
+        '''
+            raises the error of the writer thread (or if the writer has already finished)
+        '''
+        if not self.writer.is_alive():
+            if self.error is not None:
+                raise self.error
+            raise RuntimeError(f"stream recorder ({self.path}) is closed")
+
+    def _put(self, batch):
+        '''
+            hands batch to the writer - waits while the queue is full as long as the writer is alive
+        '''
+        while True:
+            self._check()
+            try:
+                self.batches.put(batch, timeout=0.1)
+                return
+            except Full:
+                pass
+
+    def record(self, event):
+        payload = event.payload
+        self.batch.append((
+            event.time,
+            payload.name,
+            event.creator.id,
+            event.receiver.id if hasattr(event, "receiver") else "",
+            payload.block.id if isinstance(payload, Messages.BlockMessage) else "",
+        ))
+
+        if len(self.batch) >= self.batch_size:
+            self._put(self.batch)
+            self.batch = []
+
+    def close(self):
+        '''
+            writes the remaining records and waits for the writer to finish
+        '''
+        if self.batch:
+            self._put(self.batch)
+            self.batch = []
+
+        self._put(None)
+        self.writer.join()
+
+        if self.error is not None:
+            raise self.error
+
+
+def from_config(params):
+    '''
+        creates the recorder described by simulation.recorder
+    '''
+    sink = params["sink"]
+
+    if sink == "none":
+        return NullRecorder()
+    elif sink == "memory":
+        return MemoryRecorder()
+    elif sink == "sampled":
+        return SampledRecorder(params["every"], params["types"])
+    elif sink == "stream":
+        return StreamRecorder(params["path"], params["batch"])
+
+    raise ValueError(f"Unknown recorder sink '{sink}' - available: none, memory, sampled, stream")
@@ -6,7 +6,7 @@ class Scheduler:
         self.node = node
 
     def schedule_broadcast_message(self, creator, time, payload, handler):
-        payload["CP"] = creator.state.cp.NAME
+        payload.CP = creator.state.cp.NAME
         # Schedules a message broadcast from node
         event = Event(handler, creator, time, payload)
 
@@ -14,13 +14,11 @@ class Scheduler:
         return event
 
     def schedule_event(self, creator, time, payload, handler, queue="main"):
-        # Schedules a local event
+        # Schedules a local event - returns a handle that can be used to cancel the event
         event = Event(handler, creator, time, payload)
 
         if queue == "main":
-            payload["CP"] = creator.state.cp.NAME
-            creator.add_event(event)
+            payload.CP = creator.state.cp.NAME
+            return creator.add_event(event)
         elif queue == "sync":
-            creator.sync_queue.add_event(event)
-
-        return event
\ No newline at end of file
+            return creator.sync_queue.add_event(event)
\ No newline at end of file
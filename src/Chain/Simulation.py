@@ -4,6 +4,8 @@ from Chain.Transaction import TransactionFactory
 from Chain.Parameters import Parameters
 from Chain.EventQueue import Queue
 
+import Chain.EventCalendar as EventCalendar
+
 import Chain.Consensus.PBFT.PBFT as PBFT
 import Chain.Consensus.BigFoot.BigFoot as BigFoot
 
@@ -11,7 +13,10 @@ import Chain.tools as tools
 
 class Simulation:
     def __init__(self, config=None) -> None:
-        self.nodes = [Node(x) for x in range(Parameters.application["Nn"])]
+        # global calendar holding the events of every node and the system
+        self.calendar = EventCalendar.create(Parameters.simulation["event_calendar"])
+
+        self.nodes = [Node(x, self.calendar) for x in range(Parameters.application["Nn"])]
 
         self.clock = 0
         
@@ -21,9 +26,7 @@ class Simulation:
 
         Parameters.simulation['txion_model'] = TransactionFactory(self.nodes)
 
-        self.system_queue = Queue()
-
-        self.q = Queue()
+        self.system_queue = Queue(self.calendar)
 
     def init_simulation(self, CP):
         genesis = Block.genesis_block()
@@ -35,34 +38,48 @@ class Simulation:
             CP.init(n)
 
     def get_next_event(self):
-        # get next blockchain event
-        next_events = [
-            (x, x.next_event) for x in self.nodes 
-            if x.state.alive and x.next_event is not None
-        ]
-        ret = min(next_events, key=lambda x: x[1])
-        node, event = ret[0], ret[1]
-
-        # get next system event
-        sys_event = self.system_queue.get_next_event()
-        
-        if sys_event is not None and sys_event.time <= event.time:
-            return self.manager, sys_event
-        else:
-            return node, event
+        '''
+            Pops the next event from the global calendar and returns it along with its handler
+            (the manager for system events or the node the event belongs to)
+
+            Events of offline nodes are held back until the node comes back online
+        '''
+        while True:
+            entry = self.calendar.pop()
+            queue = entry.queue
+
+            # next delivery of a broadcast (see EventQueue.Fanout)
+            if queue.fanout:
+                entry = queue.deliver()
+                queue = entry.queue
+
+            if queue.owner is None:
+                return self.manager, queue.retire(entry)
+            elif queue.owner.state.alive:
+                return queue.owner, queue.retire(entry)
+
+            queue.park(entry)
 
     def sim_next_event(self):        
         handler, next_event = self.get_next_event()
 
         self.clock = next_event.time
-    
-        tools.debug_logs(msg=tools.print_global_eq(self, ret=True),
-                             command=f"next -> {next_event} (enter to cont or give command): ",
+
+        # the inspector is only attached in debug mode (keeps the hot path free of closures)
+        if tools.DEBUG:
+            self.inspect(next_event)
+
+        handler.handle_next_event(next_event)
+
+    def inspect(self, next_event):
+        '''
+            Interactive inspector (debug mode only): prints the state of the simulation and prompts for a command (see tools.exec_cmd)
+        '''
+        tools.debug_logs(msg=lambda: tools.print_global_eq(self, ret=True),
+                             command=lambda: f"next -> {next_event} (enter to cont or give command): ",
                              simulator=self,
                              cmd_col=41,
                              clear=False)
-        
-        handler.handle_next_event()
 
 
     def run_simulation(self):
@@ -1,13 +1,325 @@
 from Chain.Parameters import Parameters
 
-import random, sys, numpy as np
+import Chain.Workload as Workload
 
+import numpy as np
+
+from array import array
+from bisect import bisect_left, insort
 from collections import namedtuple
-from bisect import insort
+from math import ceil
 
 
 ##############################   MODELS TRANSACTION  ##########################################
-Transaction = namedtuple("Transaction", "id timestamp size")
+Transaction = namedtuple("Transaction", "id timestamp size fee", defaults=(0.0,))
+
+
+class Mempool:
+    '''
+        Shared append-only store of every generated transaction (in generation order - timestamps never decrease)
+
+        Transactions are stored as columns (timestamps, sizes, fees) - the id of a transaction is its position.
+        Transaction tuples are only created when a transaction is read (e.g when it is packed into a block)
+
+        Nodes do not keep their own copies of the transactions - each node has a Pool (view of the mempool)
+        that tracks which transactions the node has committed
+
+        Fee index (shared by the pools - used by Pool.select): the positions of the transactions bucketed by
+        fee density (fee / size) - _RESOLUTION buckets per doubling of the density, positions in generation order
+        within a bucket. Transactions with no fee share the lowest bucket, transactions of size 0 the highest
+            buckets - bucket key -> positions
+            keys - the keys of the buckets (ascending)
+
+        Transactions larger than max_size (the block size) can never be packed - they are left out of the fee
+        index and listed in 'oversized' (positions) so the pools drop them (see Pool._drop_oversized)
+    '''
+    _RESOLUTION = 64
+    _LOWEST = -2**62
+    _HIGHEST = 2**62
+
+    def __init__(self, max_size=float('inf'), capacity=1024):
+        self.count = 0
+        self.max_size = max_size
+        self.timestamps = np.empty(capacity)
+        self.sizes = np.empty(capacity)
+        self.fees = np.empty(capacity)
+
+        # size of the smallest transaction (nothing fits in a block with less room left)
+        self.min_size = float('inf')
+
+        self.buckets = {}
+        self.keys = []
+
+        self.oversized = array('q')
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, i):
+        return Transaction(i, float(self.timestamps[i]), float(self.sizes[i]), float(self.fees[i]))
+
+    def extend(self, timestamps, sizes, fees=None):
+        '''
+            appends the transactions given as columns (fees default to 0)
+        '''
+        end = self.count + len(timestamps)
+
+        if end > len(self.timestamps):
+            capacity = max(end, 2 * len(self.timestamps))
+            self.timestamps = np.resize(self.timestamps, capacity)
+            self.sizes = np.resize(self.sizes, capacity)
+            self.fees = np.resize(self.fees, capacity)
+
+        self.timestamps[self.count:end] = timestamps
+        self.sizes[self.count:end] = sizes
+        self.fees[self.count:end] = 0.0 if fees is None else fees
+
+        if len(sizes):
+            self.min_size = min(self.min_size, float(np.min(sizes)))
+            self.index_fees(self.count, end)
+        self.count = end
+
+    def index_fees(self, start, end):
+        '''
+            adds the transactions at positions [start, end) to the fee index
+        '''
+        fees, sizes = self.fees[start:end], self.sizes[start:end]
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            density = np.where(sizes > 0, fees / sizes, np.inf)
+            keys = np.floor(np.log2(density) * Mempool._RESOLUTION)
+
+        keys = np.where(density > 0, keys, Mempool._LOWEST)
+        keys = np.where(np.isinf(density), Mempool._HIGHEST, keys).astype(np.int64)
+
+        positions = np.arange(start, end, dtype=np.int64)
+
+        oversized = sizes > self.max_size
+        if oversized.any():
+            self.oversized.extend(positions[oversized].tolist())
+            keys, positions = keys[~oversized], positions[~oversized]
+
+        # group the positions by key (stable - generation order within a bucket)
+        order = np.argsort(keys, kind='stable')
+        keys = keys[order]
+        splits = np.flatnonzero(np.diff(keys)) + 1
+
+        for first, group in zip(np.concatenate(([0], splits)).tolist(), np.split(positions[order], splits)):
+            key = int(keys[first])
+
+            if key not in self.buckets:
+                self.buckets[key] = array('q')
+                insort(self.keys, key)
+
+            self.buckets[key].extend(group.tolist())
+
+    def index(self, tx):
+        return tx.id
+
+    def search(self, time, lo=0):
+        '''
+            position of the first transaction after lo with timestamp > time
+        '''
+        return lo + int(np.searchsorted(self.timestamps[lo:self.count], time, side='right'))
+
+    def view(self):
+        '''
+            pool of a node joining now (it only sees transactions generated from now on)
+        '''
+        return Pool(self, self.count)
+
+
+class Pool:
+    '''
+        The transaction pool of a node - the transactions of the mempool the node has not committed yet
+        (iterating yields them in generation order without copying the mempool)
+
+        cursor - position (in the mempool) of the first transaction the node has not committed
+        committed - bitmap (1 byte per transaction) of the committed transactions from position 'offset' on
+        ahead - number of committed transactions after the cursor
+
+        starts - bucket key -> number of leading entries of the bucket (in the fee index of the mempool)
+                 the node has committed (select skips them without looking at them again)
+        dropped - number of the mempool's oversized transactions the pool has dropped (marked as committed -
+                  they never fit in a block so they would hold the cursor back for the rest of the run)
+    '''
+    _TRIM = 4096
+
+    def __init__(self, mempool, start):
+        self.mempool = mempool
+
+        self.cursor = start
+        self.offset = start
+        self.committed = bytearray()
+        self.ahead = 0
+
+        self.starts = {}
+        self.dropped = bisect_left(mempool.oversized, start)
+
+    def __len__(self):
+        self._drop_oversized()
+        return len(self.mempool) - self.cursor - self.ahead
+
+    def __iter__(self):
+        return self._uncommitted(len(self.mempool))
+
+    def _drop_oversized(self):
+        '''
+            marks the oversized transactions generated since the last call as committed
+        '''
+        oversized = self.mempool.oversized
+
+        if self.dropped < len(oversized):
+            positions = oversized[self.dropped:]
+            self.dropped = len(oversized)
+            self._mark(positions)
+
+    def _uncommitted(self, end):
+        self._drop_oversized()
+        mempool, committed, offset = self.mempool, self.committed, self.offset
+
+        for i in range(self.cursor, end):
+            j = i - offset
+            if j >= len(committed) or not committed[j]:
+                yield mempool[i]
+
+    def is_committed(self, i):
+        j = i - self.offset
+        return i < self.cursor or (j < len(self.committed) and self.committed[j])
+
+    def available(self, time):
+        '''
+            uncommitted transactions with timestamp <= time (bisect on the timestamps of the mempool)
+        '''
+        return self._uncommitted(self.mempool.search(time, self.cursor))
+
+    def first(self):
+        '''
+            earliest uncommitted transaction (None if the pool is empty)
+        '''
+        return self.mempool[self.cursor] if len(self) else None
+
+    def wait(self, time, deadline):
+        '''
+            time at which a node looking for transactions finds some in its pool - the node checks every
+            second from 'time' for as long as time + 1 < deadline (-1 if the pool is still empty by then)
+
+            jumps straight to the first second at which the earliest transaction is available
+        '''
+        first = self.first()
+
+        if first is None:
+            return -1
+
+        if first.timestamp <= time:
+            return time
+
+        seconds = ceil(first.timestamp - time)
+
+        return time + seconds if time + seconds < deadline else -1
+
+    def select(self, time, capacity, max_skips):
+        '''
+            greedy by fee density - picks the available transactions with the highest fee / size that fit in capacity
+            (transactions that do not fit are skipped - gives up after max_skips consecutive skips)
+
+            walks the fee index of the mempool from the highest bucket down (generation order within a bucket)
+            skipping the transactions the node has committed or that are not available at time
+
+            returns (transactions, size) - transactions stay in the pool until a block with them is added
+        '''
+        self._drop_oversized()
+        mempool, starts = self.mempool, self.starts
+        limit = mempool.search(time, self.cursor)
+
+        transactions, size, skips = [], 0, 0
+
+        for key in reversed(mempool.keys):
+            if skips >= max_skips or capacity - size < mempool.min_size:
+                break
+
+            bucket = mempool.buckets[key]
+
+            # move past the committed front of the bucket
+            start = starts.get(key, 0)
+            while start < len(bucket) and self.is_committed(bucket[start]):
+                start += 1
+            starts[key] = start
+
+            for i in range(start, len(bucket)):
+                position = bucket[i]
+
+                # positions increase within a bucket - the rest are not available yet
+                if position >= limit:
+                    break
+                if self.is_committed(position):
+                    continue
+
+                tx = mempool[position]
+
+                if size + tx.size <= capacity:
+                    transactions.append(tx)
+                    size += tx.size
+                    skips = 0
+                else:
+                    skips += 1
+
+                if skips >= max_skips or capacity - size < mempool.min_size:
+                    break
+
+        return transactions, size
+
+    def copy(self):
+        '''
+            pool with the same committed transactions (state summary sent to a node joining through a snapshot)
+        '''
+        pool = Pool(self.mempool, self.cursor)
+        pool.offset = self.offset
+        pool.committed = bytearray(self.committed)
+        pool.ahead = self.ahead
+        pool.starts = dict(self.starts)
+        pool.dropped = self.dropped
+
+        return pool
+
+    def commit(self, transactions):
+        '''
+            marks the transactions (of a block added by the node) as committed - O(block size)
+        '''
+        self._drop_oversized()
+        self._mark(self.mempool.index(tx) for tx in transactions)
+
+    def _mark(self, positions):
+        '''
+            marks the transactions at positions as committed and moves the cursor past the committed prefix
+        '''
+        committed = self.committed
+
+        for i in positions:
+            # allready committed (or generated before the node joined)
+            if i < self.cursor:
+                continue
+
+            j = i - self.offset
+            if j >= len(committed):
+                committed.extend(bytes(j + 1 - len(committed)))
+
+            if not committed[j]:
+                committed[j] = 1
+                self.ahead += 1
+
+        # move the cursor past the committed prefix
+        j = self.cursor - self.offset
+        end = committed.find(0, j)
+        end = len(committed) if end == -1 else end
+
+        self.ahead -= end - j
+        self.cursor = self.offset + end
+
+        # forget the bitmap before the cursor
+        if end >= Pool._TRIM:
+            del committed[:end]
+            self.offset = self.cursor
 
 
 class TransactionFactory:
@@ -16,29 +328,34 @@ class TransactionFactory:
     '''
     def __init__(self, nodes) -> None:
         self.nodes = nodes
+        self.mempool = Mempool(Parameters.data["Bsize"])
+        self.workload = Workload.create()
+
+        for node in nodes:
+            self.assign_pool(node)
 
-    def transaction_prop(self, tx):
-        for node in self.nodes:
-            node.pool.append(tx)
+    def assign_pool(self, node):
+        node.pool = self.mempool.view()
 
     def generate_interval_txions(self, start):
-        for second in range(round(start), round(start + Parameters.application["TI_dur"])):
-            for _ in range(Parameters.application["Tn"]):
-                id =  Parameters.application["txIDS"]
-                Parameters.application["txIDS"] += 1
-                            
-                timestamp = second
-                
-                #size = random.expovariate(1/Parameters.simulation["Tsize"])
-                size = Parameters.application["Tsize"]
-
-                self.transaction_prop(Transaction(id, timestamp, size))
-
-    def execute_transactions(self, pool):
+        '''
+            generates the transactions of the interval starting at start (see Workload)
+        '''
+        self.mempool.extend(*self.workload.interval(round(start), round(start + Parameters.application["TI_dur"])))
+
+    def execute_transactions(self, pool, time):
+        '''
+            packs the transactions of pool available at time into a block (data.pack_policy)
+                priority - greedy by fee density, skipping transactions that do not fit (FIFO for equal fees - see Pool.select)
+                fifo - in generation order, stops at the first transaction that does not fit
+        '''
+        if Parameters.data["pack_policy"] == "priority":
+            return pool.select(time, Parameters.data["Bsize"], Parameters.data["pack_max_skips"])
+
         transactions = []
         size = 0
 
-        for tx in pool:
+        for tx in pool.available(time):
             if size + tx.size <= Parameters.data["Bsize"]:
                 transactions.append(tx)
                 size += tx.size
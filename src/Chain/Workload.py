@@ -0,0 +1,250 @@
+'''
+    Transaction workloads - generate the transactions of each interval ([start, start + TI_dur)) as columns
+    (timestamps, sizes, fees) in one call (see TransactionFactory.generate_interval_txions)
+
+    Arrival models (application.workload.arrivals) - Tn is the (mean) number of transactions per second:
+        fixed - Tn transactions at every whole second
+        poisson - Poisson process with rate Tn (sub-second timestamps)
+        mmpp - Markov modulated Poisson process (bursty): the rate switches between Tn * rates[i]
+               staying in state i for an exponentially distributed time with mean sojourn[i] (seconds)
+        diurnal - Poisson process with rate Tn * (1 + amplitude * sin(2 pi (t - phase) / period))
+
+    Size distributions (application.workload.sizes) - Tsize is the (mean) size of a transaction:
+        fixed - Tsize
+        exponential - exponential with mean Tsize
+        lognormal - lognormal with mean Tsize and shape size_sigma
+
+    Fee distributions (application.workload.fees):
+        zero - every transaction pays no fee
+        exponential - exponential with mean fee_mean
+
+    Random draws use a dedicated numpy Generator seeded from the global numpy random state
+    (runs seeded through np.random.seed stay reproducible)
+
+    Traces (application.workload.trace) - replays the transactions of a csv or parquet file instead
+    (columns: timestamp (s), size (same unit as Tsize) and optionally fee). The file is streamed in chunks
+    as the simulation advances so only the rows of the current interval are kept in memory.
+    Rows must be sorted by timestamp. Parquet files need pyarrow.
+'''
+from Chain.Parameters import Parameters
+
+import numpy as np
+import pandas as pd
+
+
+########################## ARRIVALS ###########################
+
+def fixed_arrivals(workload, start, end):
+    rate = Parameters.application["Tn"]
+    return np.repeat(np.arange(start, end, dtype=float), rate)
+
+
+def poisson_arrivals(workload, start, end, rate=None):
+    rate = Parameters.application["Tn"] if rate is None else rate
+    n = workload.rng.poisson(rate * (end - start))
+    return np.sort(workload.rng.uniform(start, end, n))
+
+
+def mmpp_arrivals(workload, start, end):
+    params = Parameters.application["workload"]["mmpp"]
+    rates, sojourn = params["rates"], params["sojourn"]
+
+    # the state of the modulating chain carries over between intervals
+    if workload.mmpp is None:
+        state = workload.rng.integers(len(rates))
+        workload.mmpp = [state, start + workload.rng.exponential(sojourn[state])]
+
+    segments = []
+    t = start
+    while t < end:
+        state, switch = workload.mmpp
+        segment_end = min(switch, end)
+
+        segments.append(poisson_arrivals(
+            workload, t, segment_end, Parameters.application["Tn"] * rates[state]))
+
+        if switch <= end:
+            state = (state + 1) % len(rates)
+            workload.mmpp = [state, switch + workload.rng.exponential(sojourn[state])]
+
+        t = segment_end
+
+    return np.concatenate(segments)
+
+
+def diurnal_arrivals(workload, start, end):
+    params = Parameters.application["workload"]["diurnal"]
+    amplitude = abs(params["amplitude"])
+
+    # thinning: candidates at the peak rate - kept with probability rate(t) / peak rate
+    candidates = poisson_arrivals(
+        workload, start, end, Parameters.application["Tn"] * (1 + amplitude))
+
+    rate = 1 + params["amplitude"] * np.sin(2 * np.pi * (candidates - params["phase"]) / params["period"])
+    keep = workload.rng.uniform(0, 1 + amplitude, len(candidates)) < rate
+
+    return candidates[keep]
+
+
+ARRIVALS = {
+    "fixed": fixed_arrivals,
+    "poisson": poisson_arrivals,
+    "mmpp": mmpp_arrivals,
+    "diurnal": diurnal_arrivals,
+}
+
+########################## SIZES ###########################
+
+def fixed_sizes(workload, n):
+    return np.full(n, Parameters.application["Tsize"], dtype=float)
+
+
+def exponential_sizes(workload, n):
+    return workload.rng.exponential(Parameters.application["Tsize"], n)
+
+
+def lognormal_sizes(workload, n):
+    sigma = Parameters.application["workload"]["size_sigma"]
+    mu = np.log(Parameters.application["Tsize"]) - sigma ** 2 / 2
+
+    return workload.rng.lognormal(mu, sigma, n)
+
+
+SIZES = {
+    "fixed": fixed_sizes,
+    "exponential": exponential_sizes,
+    "lognormal": lognormal_sizes,
+}
+
+########################## FEES ###########################
+
+def zero_fees(workload, n):
+    return None
+
+
+def exponential_fees(workload, n):
+    return workload.rng.exponential(Parameters.application["workload"]["fee_mean"], n)
+
+
+FEES = {
+    "zero": zero_fees,
+    "exponential": exponential_fees,
+}
+
+########################## WORKLOAD ###########################
+
+class SyntheticWorkload:
+    '''
+        Generates transactions from the arrival model and size/fee distributions set in application.workload
+    '''
+    def __init__(self):
+        params = Parameters.application["workload"]
+
+        if params["arrivals"] not in ARRIVALS:
+            raise ValueError(f"Unknown arrival model '{params['arrivals']}' - available: {list(ARRIVALS)}")
+        if params["sizes"] not in SIZES:
+            raise ValueError(f"Unknown size distribution '{params['sizes']}' - available: {list(SIZES)}")
+        if params["fees"] not in FEES:
+            raise ValueError(f"Unknown fee distribution '{params['fees']}' - available: {list(FEES)}")
+
+        self.arrivals = ARRIVALS[params["arrivals"]]
+        self.sizes = SIZES[params["sizes"]]
+        self.fees = FEES[params["fees"]]
+
+        self.rng = np.random.default_rng(np.random.randint(2**32 - 1))
+
+        # state of the mmpp chain ([state, time of the next switch])
+        self.mmpp = None
+
+    def interval(self, start, end):
+        '''
+            returns the (timestamps, sizes, fees) of the transactions arriving in [start, end) - timestamps in ascending order
+        '''
+        timestamps = self.arrivals(self, start, end)
+        return timestamps, self.sizes(self, len(timestamps)), self.fees(self, len(timestamps))
+
+
+class TraceWorkload:
+    '''
+        Replays the transactions of a trace file - read in chunks of 'chunk' rows when an interval needs them
+
+        buffer - rows read but not yet generated (timestamps, sizes, fees)
+        offset - subtracted from the timestamps of the trace (the first timestamp if rebase - the trace starts at time 0)
+    '''
+    def __init__(self, path, chunk=100_000, rebase=True):
+        self.path = path
+        self.chunks = TraceWorkload.read(path, chunk)
+
+        self.buffer = (np.empty(0), np.empty(0), np.empty(0))
+        self.offset = None if rebase else 0.0
+        self.exhausted = False
+
+    @staticmethod
+    def read(path, chunk):
+        '''
+            yields the trace as dataframes of (at most) chunk rows
+        '''
+        if path.endswith(".parquet"):
+            try:
+                import pyarrow.parquet as pq
+            except ImportError:
+                raise ImportError("Replaying parquet traces requires pyarrow (pip install pyarrow)")
+
+            for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk):
+                yield batch.to_pandas()
+        else:
+            yield from pd.read_csv(path, chunksize=chunk)
+
+    def load(self):
+        '''
+            reads the next chunk of the trace - returns its (timestamps, sizes, fees) (None once the trace is exhausted)
+        '''
+        chunk = next(self.chunks, None)
+
+        if chunk is None:
+            self.exhausted = True
+            return None
+
+        timestamps = chunk["timestamp"].to_numpy(dtype=float)
+        if self.offset is None:
+            self.offset = timestamps[0] if len(timestamps) else 0.0
+
+        fees = chunk["fee"].to_numpy(dtype=float) if "fee" in chunk else np.zeros(len(chunk))
+
+        return timestamps - self.offset, chunk["size"].to_numpy(dtype=float), fees
+
+    def interval(self, start, end):
+        '''
+            returns the (timestamps, sizes, fees) of the transactions of the trace before end (in [start, end))
+
+            the chunks needed are collected first and joined with the buffer once
+        '''
+        parts = [self.buffer]
+        last = self.buffer[0][-1] if len(self.buffer[0]) else None
+
+        while not self.exhausted and (last is None or last < end):
+            part = self.load()
+            if part is not None and len(part[0]):
+                parts.append(part)
+                last = part[0][-1]
+
+        if len(parts) > 1:
+            self.buffer = tuple(np.concatenate(c) for c in zip(*parts))
+
+        split = int(np.searchsorted(self.buffer[0], end, side='left'))
+        interval = tuple(c[:split] for c in self.buffer)
+        self.buffer = tuple(c[split:] for c in self.buffer)
+
+        return interval
+
+
+def create():
+    '''
+        returns the workload set in application.workload (trace replay if a trace is given)
+    '''
+    params = Parameters.application["workload"]
+
+    if params["trace"] is not None:
+        return TraceWorkload(params["trace"], params["trace_chunk"], params["trace_rebase"])
+
+    return SyntheticWorkload()
@@ -5,9 +5,22 @@ import yaml
 
 from Chain.Parameters import Parameters
 
+# debug mode - resolved once at start up (set_env_vars_from_config) and when debugging starts (--debug_at)
+DEBUG = False
+
+def set_debug(enabled):
+    '''
+        enables/disables debug mode (the 'nd' cmd arg always disables it)
+    '''
+    global DEBUG
+    DEBUG = enabled and "nd" not in sys.argv
+
 def debug_logs(msg, **kwargs):
     '''
         must set enviroment variable 'debug' to true (env_vars.yaml)] (can overwrite with nd as cmd arg)
+
+        msg, input and command can be strings or functions returning the string (thunks) - pass a thunk
+        when building the string is expensive, it is only called when debug mode is on (no DEBUG guard needed)
         colors: 
             40:black
             41:red
@@ -19,12 +32,19 @@ def debug_logs(msg, **kwargs):
             47:white
     '''
 
-    if os.environ['debug'] == "True"  and "nd" not in sys.argv:
+    if DEBUG:
+        if callable(msg):
+            msg = msg()
+
         if 'col' in kwargs:
             msg = color(msg, kwargs["col"])
 
         print(msg, end=kwargs['end'] if 'end' in kwargs else '\n')
 
+        for key in ('input', 'command'):
+            if callable(kwargs.get(key)):
+                kwargs[key] = kwargs[key]()
+
         if 'input' in kwargs:
             if "in_col" in kwargs:
                 kwargs['input'] = color(kwargs['input'], kwargs['in_col'])
@@ -76,6 +96,8 @@ def set_env_vars_from_config(name="env_vars.yaml"):
     if '--debug_at' in sys.argv:
             os.environ["start_debug"] = get_named_cmd_arg('--debug_at')
             os.environ["debug"] = "False"
+
+    set_debug(os.environ["debug"] == "True")
     
 def exec_cmd(simulator, cmd):
     ''' When debug mode is on - a command can be given as input (this handles the execution)'''
@@ -97,7 +119,7 @@ def exec_cmd(simulator, cmd):
         node = int(cmd[1])
         round = int(cmd[2])
         simulator.nodes[node].state.cp_state.round.round = round
-        simulator.nodes[node].state.cp_state.timeout.payload['round'] = round
+        simulator.nodes[node].state.cp_state.timeout.event.payload.round = round
         return f"Set nodes {node} round to {round}"
     elif cmd[0] == "stop":
         exit()
@@ -111,6 +133,8 @@ def exec_cmd(simulator, cmd):
         simulator.manager.add_node()
     elif cmd[0] == "remove_node":
         simulator.manager.remove_node() 
+    elif cmd[0] == "history":
+        return history_usage(simulator)
     else:
         return f"No such command: {cmd}"
 
@@ -144,7 +168,7 @@ def print_global_eq(simulator, ret=False, indiv=True):
             for e in reversed(n.sync_queue.event_list):
                 s += "\t" + e.__str__() + '\n'
             s += color("backlog", 43) + '\n'
-            for e in reversed(n.backlog):
+            for e in reversed(list(n.backlog)):
                 s += color("\t" + e.__str__(), 43) + '\n'
         s += color("----------SYSTEM EVENTS------------", 44) + '\n'
         for e in reversed(simulator.system_queue.event_list):
@@ -169,6 +193,20 @@ def print_indiv_eqs(simulator):
             print(e)
 
 
+def history_usage(simulator):
+    ''' the number of processed events kept in the event histories and the memory they hold (the 'history' cmd) '''
+    queues = [q for n in simulator.nodes for q in (n.queue, n.sync_queue)] + [simulator.system_queue]
+
+    events = sum(len(q.history) for q in queues)
+    size = sum(q.history.memory_usage() for q in queues)
+
+    return f"EVENT HISTORY: {events} events | {round(size / 1000, 2)} KB"
+
+
+def print_history_usage(simulator):
+    print(history_usage(simulator))
+
+
 def print_node_state(simulator):
     for n in simulator.nodes:
         print(n)
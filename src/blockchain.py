@@ -9,6 +9,8 @@ import Chain.Consensus.PBFT.PBFT as PBFT
 
 from Chain.Metrics import SimulationState, Metrics
 
+import Chain.tools as tools
+
 ############### SEEDS ############
 seed = 5
 random.seed(seed)
@@ -29,6 +31,8 @@ def run():
             '| pbft:',len([x for x in n.blockchain if x.consensus == PBFT]),
             '| bf:',len([x for x in n.blockchain if x.consensus == BigFoot]),
             )
+
+    tools.debug_logs(msg=lambda: tools.history_usage(manager.sim))
     
     SimulationState.store_state(manager.sim)
 
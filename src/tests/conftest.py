@@ -0,0 +1,5 @@
+import os
+import sys
+
+# the simulator is run from src (imports are Chain.X)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
@@ -0,0 +1,33 @@
+from Chain.Block import Block
+from Chain.ChainStore import ChainStore
+
+
+def chain(length):
+    store = ChainStore()
+    genesis = Block.genesis_block()
+    store.append(genesis, 0.0)
+
+    for depth in range(1, length):
+        store.append(Block(depth, Block.next_id(), store[-1].id), float(depth))
+
+    return store
+
+
+def test_find_resolves_ids_to_depths():
+    store = chain(10)
+
+    assert [store.find(block.id) for block in store] == list(range(10))
+    assert store.find(-1) is None
+
+
+def test_find_through_prefix():
+    source = chain(10)
+    view = source.prefix(6)
+    view.append(Block(6, Block.next_id(), view[-1].id), 6.5)
+
+    assert view.find(source[5].id) == 5
+    assert view.find(view[6].id) == 6
+
+    # blocks the source added after the shared history are not in the view
+    assert view.find(source[6].id) is None
+    assert source.find(view[6].id) is None
@@ -0,0 +1,29 @@
+from Chain.Network import Network
+from Chain.Parameters import Parameters
+
+import numpy as np
+
+
+def test_hierarchical_links(monkeypatch):
+    monkeypatch.setattr(Parameters, "network", {
+        "use_latency": "measured", "latency_model": "hierarchical",
+        "same_city_latency_ms": 10, "same_city_dev_ms": 5,
+        "queueing_delay": 0, "processing_delay": 0,
+        "latency_jitter": True, "jitter_batch": 16,
+    }, raising=False)
+    monkeypatch.setattr(Network, "nodes", [])
+
+    Network.init_delay_matrices()
+
+    # memory is O(regions^2 + cities) - no city matrix is kept
+    assert Network.location_latency is None
+    assert Network.region_latency.shape == (len(Network.region_dev),) * 2
+
+    cities = len(Network.locations)
+    latency, dev = Network.links(3, np.arange(cities))
+
+    assert np.allclose(latency, [Network.link(3, j)[0] for j in range(cities)])
+    assert np.allclose(dev, [Network.link(3, j)[1] for j in range(cities)])
+    assert (latency[3], dev[3]) == Network.intra_city
+    assert np.allclose(Network.intra_city, (0.01, 0.005))
+    assert (latency > 0).all()
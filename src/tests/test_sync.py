@@ -0,0 +1,49 @@
+from Chain.Manager import Manager
+from Chain.Parameters import Parameters
+
+import numpy as np
+
+import os
+import random
+
+SRC = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+
+
+def test_snapshot_join_commits_range_synced_transactions(monkeypatch):
+    monkeypatch.chdir(SRC)
+    monkeypatch.setattr("sys.argv", ["blockchain.py", "nd"])
+
+    load = Parameters.load_params_from_config
+
+    def load_params():
+        load()
+        Parameters.simulation["simTime"] = 250
+        Parameters.simulation["join_sync"]["mode"] = "snapshot"
+
+    monkeypatch.setattr(Parameters, "load_params_from_config", staticmethod(load_params))
+
+    random.seed(5)
+    np.random.seed(5)
+
+    manager = Manager()
+    manager.set_up()
+
+    joined, leaked = None, None
+    while manager.sim.clock <= Parameters.simulation["simTime"]:
+        manager.sim.sim_next_event()
+        manager.update_sim()
+
+        if joined is None and manager.sim.clock >= 150:
+            manager.add_node()
+            joined = manager.sim.nodes[-1]
+            checkpoint = manager.sim.nodes[0].last_block.depth
+
+        # as soon as the joined node is synced its pool holds nothing from its own chain
+        if joined is not None and leaked is None and joined.state.synced:
+            chain = {tx.id for block in joined.blockchain for tx in block.transactions}
+            leaked = chain & {tx.id for tx in joined.pool}
+
+            # blocks after the checkpoint were range synced
+            assert joined.last_block.depth > checkpoint
+
+    assert leaked == set()
@@ -0,0 +1,39 @@
+from Chain.Transaction import Mempool
+
+import numpy as np
+
+
+def test_select_moves_past_oversized_transaction():
+    mempool = Mempool(max_size=1.0)
+    pool = mempool.view()
+
+    # the first transaction never fits in a block
+    mempool.extend(np.arange(6.0), np.array([5.0, 0.4, 0.4, 0.4, 0.4, 0.4]), np.ones(6))
+
+    for _ in range(3):
+        transactions, size = pool.select(10.0, 1.0, 100)
+        assert 0 not in [tx.id for tx in transactions]
+        pool.commit(transactions)
+
+    assert pool.cursor == 6
+    assert len(pool) == 0
+
+    # nothing left to pack - the fee index is not rescanned from the oversized transaction
+    assert pool.select(10.0, 1.0, 100) == ([], 0)
+    assert all(start == len(mempool.buckets[key]) for key, start in pool.starts.items())
+    assert list(pool.available(10.0)) == []
+
+
+def test_fifo_pool_skips_oversized_transaction():
+    mempool = Mempool(max_size=1.0)
+    pool = mempool.view()
+
+    mempool.extend(np.arange(3.0), np.array([0.5, 2.0, 0.5]))
+
+    assert [tx.id for tx in pool.available(10.0)] == [0, 2]
+    assert pool.first().id == 0
+
+    pool.commit([mempool[0]])
+
+    assert pool.cursor == 2
+    assert pool.first().id == 2